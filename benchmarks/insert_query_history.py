@@ -0,0 +1,95 @@
+"""
+Compare per-query write latency of writing a query's history to the
+normalized queries / articles / query_articles tables one row at a time
+against the single round trip used by insert_query_history.
+
+Run from the repository root against a development database (DB_URL):
+
+    python -m benchmarks.insert_query_history
+    python -m benchmarks.insert_query_history --sizes 10 100 1000 --repeat 20
+
+Every write happens inside a transaction that is rolled back, so the
+tables are left untouched. Latency includes the commit-equivalent round trips but
+not the final ROLLBACK.
+"""
+import time
+import json
+import uuid
+import random
+import argparse
+import statistics
+
+from utils.db_operations import connect_to_db, insert_query_history_rows
+
+def make_articles(count: int) -> list[dict]:
+    rng = random.Random(count)
+    return [
+        {
+            "article_id": str(40000000 + i),
+            "title": f"Benchmark article {i}",
+            "abstract": "Lorem ipsum dolor sit amet. " * rng.randint(20, 60),
+            "modality": rng.choice(["MRI", "CT", "PET", "Ultrasound", "X-ray"]),
+            "organ": rng.choice(["Brain", "Heart", "Liver", "Lung"]),
+            "disease": rng.choice(["Tumor", "Stroke", "Fibrosis"]),
+            "result": "Positive",
+            "year": str(rng.randint(1990, 2025))
+        }
+        for i in range(count)
+    ]
+
+def make_chart(count: int) -> dict:
+    return {"labels": [f"label {i}" for i in range(count)], "values": list(range(count))}
+
+def insert_row_by_row(cursor, user_id, query_id, query, articles, pie_chart, bar_chart):
+    """
+    The same rows as insert_query_history_rows, one statement and one round
+    trip per row
+    """
+    cursor.execute("INSERT INTO queries (query_id, user_id, query, pie_chart, bar_chart) VALUES (%s, %s, %s, %s, %s)",
+                   (query_id, user_id, query, json.dumps(pie_chart), json.dumps(bar_chart)))
+    for position, article in enumerate(articles):
+        cursor.execute("""
+            INSERT INTO articles (article_id, title, abstract, year) VALUES (%s, %s, %s, %s)
+            ON CONFLICT (article_id) DO UPDATE SET
+                title = EXCLUDED.title,
+                abstract = CASE WHEN EXCLUDED.abstract <> '' THEN EXCLUDED.abstract ELSE articles.abstract END,
+                year = COALESCE(EXCLUDED.year, articles.year),
+                updated_at = NOW()""",
+                       (article['article_id'], article['title'], article['abstract'], article['year']))
+        cursor.execute("INSERT INTO query_articles (query_id, article_id, position, modality, organ, disease, result) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                       (query_id, article['article_id'], position, article['modality'], article['organ'], article['disease'], article['result']))
+
+def measure(conn, writer, articles: list[dict], repeat: int) -> list[float]:
+    pie_chart = make_chart(len(articles))
+    bar_chart = make_chart(len(articles))
+    timings = []
+    for _ in range(repeat):
+        with conn.cursor() as cursor:
+            started = time.perf_counter()
+            writer(cursor, "benchmark-user", str(uuid.uuid4()), "benchmark query", articles, pie_chart, bar_chart)
+            timings.append((time.perf_counter() - started) * 1000)
+        conn.rollback()
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    conn = connect_to_db()
+    try:
+        print(f"{'articles':>8}  {'row-by-row p50 ms':>18}  {'bulk p50 ms':>12}  {'speedup':>8}")
+        for size in args.sizes:
+            articles = make_articles(size)
+            # Warm up the connection and the plan cache
+            measure(conn, insert_query_history_rows, articles[:1], 1)
+            row_by_row = statistics.median(measure(conn, insert_row_by_row, articles, args.repeat))
+            bulk = statistics.median(measure(conn, insert_query_history_rows, articles, args.repeat))
+            print(f"{size:>8}  {row_by_row:>18.2f}  {bulk:>12.2f}  {row_by_row / bulk:>7.1f}x")
+    finally:
+        conn.rollback()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
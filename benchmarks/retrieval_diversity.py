@@ -0,0 +1,179 @@
+"""
+Measure how many RAG prompt tokens go to redundant chunks, and what the
+diversification stage in retrieve_chunks saves, for three ways of picking
+the k chunks placed in the prompt:
+
+    top-k   plain retrieval, as before
+    dedupe  top-k with exact and near-duplicate chunks dropped (no refill)
+    mmr     DIVERSIFY_FETCH_MULTIPLIER * k candidates, near-duplicates
+            dropped, k chosen by maximal marginal relevance
+
+A chunk counts as redundant when it is textually identical or at least
+NEAR_DUPLICATE_THRESHOLD cosine-similar to a chunk placed before it.
+
+Against a real namespace (uses OpenAI embeddings and the configured store):
+
+    python -m benchmarks.retrieval_diversity --namespace chatbot --queries queries.txt
+
+Offline, on a temporary local store filled with synthetic clusters of
+near-duplicate chunks:
+
+    python -m benchmarks.retrieval_diversity --synthetic
+    python -m benchmarks.retrieval_diversity --synthetic --topics 200 --copies 4 -k 8
+"""
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+import tiktoken
+
+from utils.vector_store import LocalVectorStore
+from utils.diversify import (
+    DIVERSIFY_FETCH_MULTIPLIER, NEAR_DUPLICATE_THRESHOLD, MMR_LAMBDA,
+    normalize_rows, remove_near_duplicates, diversify_matches
+)
+
+_encoding = tiktoken.get_encoding("cl100k_base")
+
+def prompt_stats(matches: list[dict], threshold: float) -> dict:
+    """
+    Tokens in the chunks, and how many of them repeat an earlier chunk
+    """
+    if not matches:
+        return {"chunks": 0, "tokens": 0, "redundant_tokens": 0}
+    tokens = [len(_encoding.encode(match["metadata"]["text"])) for match in matches]
+    seen = set()
+    exact = []
+    for position, match in enumerate(matches):
+        text = " ".join(match["metadata"]["text"].split()).lower()
+        if text in seen:
+            exact.append(position)
+        seen.add(text)
+    kept = set(remove_near_duplicates(normalize_rows([match["values"] for match in matches]), threshold)) - set(exact)
+    return {
+        "chunks": len(matches),
+        "tokens": sum(tokens),
+        "redundant_tokens": sum(count for position, count in enumerate(tokens) if position not in kept)
+    }
+
+def compare(query_vector: list, candidates: list[dict], k: int, threshold: float, lambda_mult: float) -> dict:
+    """
+    Stats and selection time of each strategy for one query
+
+    Args:
+        candidates: list[dict] - Dense matches with values, best first, at least k of them
+    """
+    results = {}
+    started = time.perf_counter()
+    results["top-k"] = (candidates[:k], time.perf_counter() - started)
+    started = time.perf_counter()
+    results["dedupe"] = (diversify_matches(query_vector, candidates[:k], k, 1.0, threshold), time.perf_counter() - started)
+    started = time.perf_counter()
+    results["mmr"] = (diversify_matches(query_vector, candidates, k, lambda_mult, threshold), time.perf_counter() - started)
+    return {
+        name: dict(prompt_stats(matches, threshold), ms=seconds * 1000)
+        for name, (matches, seconds) in results.items()
+    }
+
+def synthetic_corpus(store: LocalVectorStore, namespace: str, topics: int, copies: int, dimension: int, seed: int):
+    """
+    topics passages, each stored copies times with a little noise in both
+    the text and the vector, like one abstract reached from several pages
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    vocabulary = [f"term{i}" for i in range(2000)]
+    centers = normalize_rows(np_rng.standard_normal((topics, dimension)))
+    vectors = []
+    for topic in range(topics):
+        words = rng.choices(vocabulary, k=rng.randint(80, 200))
+        for copy in range(rng.randint(1, copies)):
+            noisy = words[:]
+            noisy[rng.randrange(len(noisy))] = rng.choice(vocabulary)
+            vectors.append({
+                "id": f"topic{topic}-copy{copy}",
+                "values": (centers[topic] + np_rng.standard_normal(dimension) * 0.005).tolist(),
+                "metadata": {"text": f"Passage {topic}. " + " ".join(noisy)}
+            })
+    store.upsert(namespace, vectors)
+    return centers
+
+def print_summary(rows: list[dict]):
+    for name in ["top-k", "dedupe", "mmr"]:
+        tokens = [row[name]["tokens"] for row in rows]
+        redundant = [row[name]["redundant_tokens"] for row in rows]
+        chunks = [row[name]["chunks"] for row in rows]
+        ms = [row[name]["ms"] for row in rows]
+        print(
+            f"{name:>7}: {statistics.mean(chunks):5.1f} chunks  {statistics.mean(tokens):7.0f} tokens  "
+            f"{statistics.mean(redundant):7.0f} redundant ({100 * sum(redundant) / max(sum(tokens), 1):4.1f}%)  "
+            f"select p50 {statistics.median(ms):.2f} ms"
+        )
+    baseline = sum(row["top-k"]["tokens"] for row in rows)
+    deduped = sum(row["dedupe"]["tokens"] for row in rows)
+    print(f"dedupe saves {100 * (baseline - deduped) / max(baseline, 1):.1f}% of prompt tokens at the same k; "
+          f"mmr spends {100 * sum(row['mmr']['redundant_tokens'] for row in rows) / max(sum(row['mmr']['tokens'] for row in rows), 1):.1f}% "
+          f"on redundant chunks versus {100 * sum(row['top-k']['redundant_tokens'] for row in rows) / max(baseline, 1):.1f}% for top-k")
+
+def run_synthetic(args) -> list[dict]:
+    namespace = "benchmark"
+    with tempfile.TemporaryDirectory() as path:
+        store = LocalVectorStore(path)
+        centers = synthetic_corpus(store, namespace, args.topics, args.copies, args.dimension, args.seed)
+        np_rng = np.random.default_rng(args.seed + 1)
+        rows = []
+        for _ in range(args.num_queries):
+            # A query near a few topics at once, as real questions tend to be
+            mix = centers[np_rng.choice(len(centers), size=3, replace=False)].sum(axis=0)
+            query_vector = (mix + np_rng.standard_normal(args.dimension) * 0.1).tolist()
+            candidates = store.query(namespace, query_vector, args.k * args.multiplier, include_values=True)
+            rows.append(compare(query_vector, candidates, args.k, args.threshold, args.lambda_mult))
+    return rows
+
+def run_namespace(args) -> list[dict]:
+    from utils.openai_funcs import get_embeddings
+    from utils.vector_store import get_vector_store
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    store = get_vector_store()
+    rows = []
+    for query in queries:
+        query_vector = get_embeddings(query)
+        candidates = store.query(args.namespace, query_vector, args.k * args.multiplier, include_values=True)
+        if candidates:
+            rows.append(compare(query_vector, candidates, args.k, args.threshold, args.lambda_mult))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--namespace")
+    parser.add_argument("--queries", help="File with one query per line")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--multiplier", type=int, default=DIVERSIFY_FETCH_MULTIPLIER)
+    parser.add_argument("--threshold", type=float, default=NEAR_DUPLICATE_THRESHOLD)
+    parser.add_argument("--lambda-mult", type=float, default=MMR_LAMBDA)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--copies", type=int, default=3, help="Most near-duplicate copies of a synthetic passage")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        rows = run_synthetic(args)
+    elif args.namespace and args.queries:
+        rows = run_namespace(args)
+    else:
+        parser.error("pass --synthetic, or --namespace and --queries")
+
+    print(f"{len(rows)} queries, k={args.k}, {args.k * args.multiplier} candidates, "
+          f"threshold={args.threshold}, lambda={args.lambda_mult}")
+    print_summary(rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Build the Postgres keyword index (chunk_keywords) for namespaces written
+before it was enabled. New chunks are indexed as they are upserted while
+KEYWORD_INDEX_ENABLED is on, so this only needs to run once per existing
+namespace, before switching RETRIEVAL_MODE to hybrid.
+
+Run from the repository root:
+
+    python -m ingestion.build_keyword_index --namespace chatbot
+    python -m ingestion.build_keyword_index --namespace chatbot user_123 --page-size 200
+"""
+import time
+import argparse
+
+from utils.keyword_index import keyword_index, index_chunks
+from utils.vector_store import get_vector_store
+
+def build(namespace: str, page_size: int) -> int:
+    vector_store = get_vector_store()
+    token = None
+    indexed = 0
+    started = time.perf_counter()
+    while True:
+        ids, token = vector_store.list_ids(namespace, limit=page_size, pagination_token=token)
+        if ids:
+            vectors = list(vector_store.fetch(namespace, ids).values())
+            index_chunks(namespace, vectors)
+            indexed += len(vectors)
+            print(f"{namespace}: {indexed} chunks indexed ({indexed / (time.perf_counter() - started):.0f}/s)")
+        if not token:
+            return indexed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--namespace", nargs="+", required=True)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    if keyword_index is None:
+        raise SystemExit("The keyword index is disabled (KEYWORD_INDEX_ENABLED=false)")
+    for namespace in args.namespace:
+        indexed = build(namespace, args.page_size)
+        print(f"{namespace}: done, {indexed} chunks, {keyword_index.count(namespace)} in the index")
+
+if __name__ == "__main__":
+    main()
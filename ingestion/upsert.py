@@ -1,25 +1,24 @@
 import json
 import os
 
-from openai import OpenAI
 from dotenv import load_dotenv
 from llama_index.core import Document
 from llama_index.core.node_parser import (
     SemanticSplitterNodeParser,
 )
 from llama_index.embeddings.openai import OpenAIEmbedding
-from pinecone import Pinecone
 
-load_dotenv()
+from utils.openai_funcs import get_embeddings_batch
+from utils.pinecone_funcs import SHARED_NAMESPACE
+from utils.vector_store import get_vector_store
+from utils.keyword_index import index_chunks
 
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-os.environ['OPENAI_API_KEY'] = os.getenv("OPENAI_API_KEY")
+# Run from the repository root with `python -m ingestion.upsert` so that the
+# utils package is importable.
 
+load_dotenv()
 
-index = pc.Index(
-    name="chatbot",
-    host=os.getenv("PINECONE_INDEX_HOST")
-)
+os.environ['OPENAI_API_KEY'] = os.getenv("OPENAI_API_KEY")
 
 embed_model = OpenAIEmbedding()
 splitter = SemanticSplitterNodeParser(
@@ -29,8 +28,6 @@ splitter = SemanticSplitterNodeParser(
     embed_model=embed_model
 )
 
-client = OpenAI()
-
 with open('D:/chatbot_backend/ingestion/data/finalData.json', encoding='utf-8') as f:
     data = json.load(f)
 
@@ -47,26 +44,17 @@ for item in data:
     )
     documents.append(doc)
 
-def get_embeddings(text):
-    response = client.embeddings.create(
-        model="text-embedding-3-large",
-        input=text
-    )
-    return response.data[0].embedding
-
 vectors = []
 nodes = splitter.get_nodes_from_documents(documents)
-for idx, node in enumerate(nodes):
-    print("Processing node: ", idx)
-    embeddings = get_embeddings(node.text)
+print("Embedding nodes: ", len(nodes))
+node_embeddings = get_embeddings_batch([node.text for node in nodes])
+for idx, (node, embeddings) in enumerate(zip(nodes, node_embeddings)):
     vectors.append({
         "id":str(idx),
         "values":embeddings,
         "metadata":node.metadata
     })
 
-index.upsert(
-    vectors=vectors,
-    namespace="chatbot",
-    batch_size=100
-)
\ No newline at end of file
+# Written to whichever backend VECTOR_STORE_BACKEND selects
+get_vector_store().upsert(SHARED_NAMESPACE, vectors)
+index_chunks(SHARED_NAMESPACE, vectors)
\ No newline at end of file
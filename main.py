@@ -1,9 +1,16 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from routers.query_router import router as query_router
 from routers.users_router import router as users_router
 from routers.data_upload_router import router as data_upload_router
+from routers.metrics_router import router as metrics_router
+from utils.db_pool import close_pool
+from utils.pubmed_client import pubmed_client
+from utils.publication_feed import FEED_REFRESH_ENABLED, run_feed_refresher
+from utils.namespace_copy import NAMESPACE_COPY_RESUME_ENABLED, run_namespace_copy_resumer
 
 app = FastAPI()
 
@@ -15,10 +22,25 @@ app.add_middleware(
     allow_headers=["*"], 
 )
 
+@app.on_event("startup")
+async def startup():
+    app.state.feed_refresher = asyncio.create_task(run_feed_refresher()) if FEED_REFRESH_ENABLED else None
+    app.state.copy_resumer = asyncio.create_task(run_namespace_copy_resumer()) if NAMESPACE_COPY_RESUME_ENABLED else None
+
+@app.on_event("shutdown")
+async def shutdown():
+    if app.state.feed_refresher is not None:
+        app.state.feed_refresher.cancel()
+    if app.state.copy_resumer is not None:
+        app.state.copy_resumer.cancel()
+    await pubmed_client.aclose()
+    close_pool()
+
 @app.get("/")
 def read_root():
     return {"message": "Hello World"}
 
 app.include_router(query_router, prefix="/api/v1", tags=["query"])
 app.include_router(users_router, prefix="/api/v1", tags=["users"])
-app.include_router(data_upload_router, prefix="/api/v1", tags=["data_upload"])
\ No newline at end of file
+app.include_router(data_upload_router, prefix="/api/v1", tags=["data_upload"])
+app.include_router(metrics_router, prefix="/api/v1", tags=["metrics"])
\ No newline at end of file
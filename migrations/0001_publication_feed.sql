@@ -0,0 +1,24 @@
+-- Precomputed "latest relevant publications" feed, filled by the
+-- background refresher in utils/publication_feed.py
+
+CREATE TABLE IF NOT EXISTS publication_feed (
+    user_id TEXT NOT NULL,
+    article_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    abstract TEXT NOT NULL DEFAULT '',
+    source_article_id TEXT,
+    found_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, article_id)
+);
+
+CREATE INDEX IF NOT EXISTS publication_feed_user_found_at_idx
+    ON publication_feed (user_id, found_at DESC);
+
+-- When each saved article was last used as a search seed, so the next run
+-- only asks PubMed for PMIDs added since then
+CREATE TABLE IF NOT EXISTS publication_feed_seeds (
+    user_id TEXT NOT NULL,
+    source_article_id TEXT NOT NULL,
+    last_searched_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (user_id, source_article_id)
+);
@@ -0,0 +1,72 @@
+-- Split query_history, which repeats the query text and both chart JSON
+-- blobs on every article row, into queries, articles and query_articles,
+-- and copy the existing rows across. query_history itself is left in place
+-- so this can be verified before it is dropped in a later migration.
+
+CREATE TABLE IF NOT EXISTS queries (
+    query_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    query TEXT NOT NULL,
+    pie_chart JSONB,
+    bar_chart JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Query history by user, newest first
+CREATE INDEX IF NOT EXISTS queries_user_created_at_idx
+    ON queries (user_id, created_at DESC, query_id DESC);
+
+CREATE TABLE IF NOT EXISTS articles (
+    article_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    abstract TEXT NOT NULL DEFAULT '',
+    year TEXT,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- What the LLM extracted for an article in the context of one query
+CREATE TABLE IF NOT EXISTS query_articles (
+    query_id TEXT NOT NULL REFERENCES queries (query_id) ON DELETE CASCADE,
+    article_id TEXT NOT NULL REFERENCES articles (article_id),
+    position INTEGER NOT NULL,
+    modality TEXT,
+    organ TEXT,
+    disease TEXT,
+    result TEXT,
+    PRIMARY KEY (query_id, article_id)
+);
+
+-- Which queries surfaced an article
+CREATE INDEX IF NOT EXISTS query_articles_article_id_idx
+    ON query_articles (article_id);
+
+-- Backfill. query_history has no creation time, so existing queries all get
+-- the migration time and keep a stable order through query_id.
+INSERT INTO queries (query_id, user_id, query, pie_chart, bar_chart)
+SELECT DISTINCT ON (query_id)
+    query_id, user_id, query, pie_chart::text::jsonb, bar_chart::text::jsonb
+FROM query_history
+ORDER BY query_id
+ON CONFLICT (query_id) DO NOTHING;
+
+INSERT INTO articles (article_id, title, abstract, year)
+SELECT DISTINCT ON (article_id)
+    article_id, COALESCE(article_title, ''), COALESCE(abstract, ''), year::text
+FROM query_history
+WHERE article_id IS NOT NULL
+ORDER BY article_id, length(COALESCE(abstract, '')) DESC
+ON CONFLICT (article_id) DO NOTHING;
+
+INSERT INTO query_articles (query_id, article_id, position, modality, organ, disease, result)
+SELECT
+    query_id,
+    article_id,
+    (ROW_NUMBER() OVER (PARTITION BY query_id ORDER BY ctid))::INTEGER - 1,
+    modality, organ, disease, result
+FROM (
+    SELECT DISTINCT ON (query_id, article_id) ctid, query_id, article_id, modality, organ, disease, result
+    FROM query_history
+    WHERE article_id IS NOT NULL
+    ORDER BY query_id, article_id, ctid
+) AS rows
+ON CONFLICT (query_id, article_id) DO NOTHING;
@@ -0,0 +1,17 @@
+-- One row per saved article instead of a per-user array, so saving is a
+-- single INSERT ... ON CONFLICT DO NOTHING with no read-modify-write race.
+-- saved_articles is left in place until this has been verified.
+
+CREATE TABLE IF NOT EXISTS user_saved_articles (
+    user_id TEXT NOT NULL,
+    article_id TEXT NOT NULL,
+    saved_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, article_id)
+);
+
+INSERT INTO user_saved_articles (user_id, article_id)
+SELECT DISTINCT sa.user_id, saved.article_id
+FROM saved_articles sa
+CROSS JOIN LATERAL unnest(sa.saved_article_ids) AS saved(article_id)
+WHERE saved.article_id IS NOT NULL
+ON CONFLICT (user_id, article_id) DO NOTHING;
@@ -0,0 +1,12 @@
+-- save_chatbot_settings upserts on user_id, which needs a unique index.
+-- Keep only the most recently updated row for any user with duplicates.
+
+DELETE FROM chatbot_settings
+WHERE ctid NOT IN (
+    SELECT DISTINCT ON (user_id) ctid
+    FROM chatbot_settings
+    ORDER BY user_id, updated_at DESC NULLS LAST
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS chatbot_settings_user_id_key
+    ON chatbot_settings (user_id);
@@ -0,0 +1,22 @@
+-- create_user relies on these unique indexes, instead of checking first, to
+-- reject duplicate user ids and emails. Any existing duplicate emails have
+-- to be resolved by hand before this migration can apply.
+
+DO $$
+BEGIN
+    -- user_id is normally already the primary key
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = 'users'::regclass
+          AND i.indisunique
+          AND i.indnatts = 1
+          AND a.attname = 'user_id'
+    ) THEN
+        CREATE UNIQUE INDEX users_user_id_key ON users (user_id);
+    END IF;
+END
+$$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS users_email_key ON users (email);
@@ -0,0 +1,12 @@
+-- Progress of each namespace copy (utils/namespace_copy.py), so an
+-- interrupted copy resumes from the last fully written page
+
+CREATE TABLE IF NOT EXISTS namespace_copy_checkpoints (
+    source_namespace TEXT NOT NULL,
+    target_namespace TEXT NOT NULL,
+    pagination_token TEXT,
+    vectors_copied INTEGER NOT NULL DEFAULT 0,
+    completed_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (source_namespace, target_namespace)
+);
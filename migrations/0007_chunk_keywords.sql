@@ -0,0 +1,13 @@
+-- Full-text index over chunk text for hybrid retrieval (utils/keyword_index.py).
+-- It lives in Postgres so every worker and host searches the same index.
+-- Existing namespaces are backfilled with `python -m ingestion.build_keyword_index`.
+
+CREATE TABLE IF NOT EXISTS chunk_keywords (
+    namespace TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', text)) STORED,
+    PRIMARY KEY (namespace, chunk_id)
+);
+
+CREATE INDEX IF NOT EXISTS chunk_keywords_tsv_idx ON chunk_keywords USING GIN (tsv);
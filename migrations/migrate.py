@@ -0,0 +1,143 @@
+"""
+Apply the SQL migrations in this directory to the database in DB_URL.
+
+Run from the repository root:
+
+    python -m migrations.migrate            # apply everything pending
+    python -m migrations.migrate --status   # list applied and pending migrations
+
+Migrations are files named NNNN_description.sql, applied in version order,
+each in its own transaction together with its row in schema_migrations, so
+a failed migration leaves nothing half applied. A Postgres advisory lock
+stops two deploys from migrating at the same time. Applied files must not
+be edited; add a new migration instead.
+"""
+import os
+import re
+import sys
+import hashlib
+import argparse
+import traceback
+
+from utils.logger import logger
+from utils.db_operations import connect_to_db
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d{4})_(\w+)\.sql$")
+# Arbitrary key for the advisory lock held while migrating
+MIGRATION_LOCK_KEY = 7263000
+
+def discover_migrations(directory: str = MIGRATIONS_DIR) -> list[tuple[str, str, str]]:
+    """
+    Find the migration files in directory
+
+    Args:
+        directory: str - Directory holding NNNN_description.sql files
+
+    Returns:
+        list[tuple] - (version, name, path) sorted by version
+    """
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if match:
+            migrations.append((match.group(1), match.group(2), os.path.join(directory, filename)))
+    migrations.sort()
+
+    versions = [version for version, _, _ in migrations]
+    duplicates = {version for version in versions if versions.count(version) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate migration versions: {sorted(duplicates)}")
+    return migrations
+
+def _checksum(sql: str) -> str:
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+
+def get_applied_migrations(cursor) -> dict:
+    """
+    Returns:
+        dict - version -> checksum of every applied migration
+    """
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cursor.fetchall())
+
+def migrate(conn, status_only: bool = False) -> list[str]:
+    """
+    Apply every pending migration in version order
+
+    Args:
+        conn: psycopg2.connection - Dedicated connection, not a pooled one
+        status_only: bool - Only report what is applied and pending
+
+    Returns:
+        list[str] - Versions applied (or pending, with status_only)
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        ensure_migrations_table(cursor)
+        conn.commit()
+
+        try:
+            applied = get_applied_migrations(cursor)
+            done = []
+            for version, name, path in discover_migrations():
+                with open(path, encoding="utf-8") as f:
+                    sql = f.read()
+                checksum = _checksum(sql)
+
+                if version in applied:
+                    if applied[version] != checksum:
+                        logger.warning(f"Migration {version}_{name} was edited after it was applied")
+                    if status_only:
+                        print(f"applied  {version}_{name}")
+                    continue
+
+                if status_only:
+                    print(f"pending  {version}_{name}")
+                    done.append(version)
+                    continue
+
+                logger.info(f"Applying migration {version}_{name}")
+                try:
+                    cursor.execute(sql)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                        (version, name, checksum)
+                    )
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Migration {version}_{name} failed: {traceback.format_exc()}")
+                    raise e
+                done.append(version)
+            return done
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+            conn.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="List applied and pending migrations without applying anything")
+    args = parser.parse_args()
+
+    conn = connect_to_db()
+    try:
+        versions = migrate(conn, status_only=args.status)
+    finally:
+        conn.close()
+
+    if not args.status:
+        print(f"Applied {len(versions)} migration(s)" if versions else "Database is up to date")
+
+if __name__ == "__main__":
+    sys.exit(main())
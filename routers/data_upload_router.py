@@ -12,7 +12,7 @@ from schemas.data_upload_schema import ScrapeSingleUrlRequest, ScrapeSingleUrlRe
     FetchWebCrawlUrlsRequest, FetchWebCrawlUrlsResponse, FetchDocumentsRequest, FetchDocumentsResponse
 
 from utils.data_upload_utils import get_chunks
-from utils.openai_funcs import get_embeddings
+from utils.openai_funcs import get_embeddings_batch
 from utils.pinecone_funcs import upsert_chunks
 from utils.db_operations import (
     update_single_page_urls,
@@ -23,6 +23,7 @@ from utils.db_operations import (
     get_single_page_urls,
     get_web_crawl_urls
 )
+from utils.db_pool import run_db
 from utils.document_processor import process_and_upsert_documents
 from utils.web_crawler import crawl_website
 
@@ -39,9 +40,9 @@ def process_url_content_background(url: str, content: str, user_id: str):
     """
     try:
         chunks = get_chunks(content)
+        embeddings = get_embeddings_batch(chunks)
         vectors = []
-        for chunk in chunks:
-            vector = get_embeddings(chunk)
+        for chunk, vector in zip(chunks, embeddings):
             vectors.append({
                 "id": str(uuid.uuid4()),
                 "values": vector,
@@ -77,7 +78,7 @@ async def scrape_single_url_api(
             raise Exception(f"Failed to scrape url: {request.url}")
         
         # Update single page URLs immediately
-        update_single_page_urls(request.user_id, request.url)
+        await run_db(update_single_page_urls, request.user_id, request.url)
         
         # Process content and upsert chunks in background
         background_tasks.add_task(
@@ -122,7 +123,7 @@ async def web_crawl_api(request: WebCrawlRequest, background_tasks: BackgroundTa
     """
     try:
         # Create a new crawling job
-        job_id = create_crawling_job(request.user_id, request.url)
+        job_id = await run_db(create_crawling_job, request.user_id, request.url)
         
         # Start crawling in background with specified depth
         background_tasks.add_task(
@@ -165,7 +166,7 @@ async def get_web_crawl_status(
         dict: Job status information
     """
     try:
-        job_status = get_job_status(request.job_id, request.user_id)
+        job_status = await run_db(get_job_status, request.job_id, request.user_id)
         if not job_status:
             raise HTTPException(
                 status_code=404,
@@ -198,7 +199,7 @@ async def get_user_single_page_urls(request: FetchSinglePageUrlsRequest ):
         dict: List of single page URLs
     """
     try:
-        urls = get_single_page_urls(request.user_id)
+        urls = await run_db(get_single_page_urls, request.user_id)
         return JSONResponse(
             status_code=200,
             content={
@@ -225,7 +226,7 @@ async def get_user_web_crawl_urls(request: FetchWebCrawlUrlsRequest):
         dict: List of web crawl URLs
     """
     try:
-        urls = get_web_crawl_urls(request.user_id)
+        urls = await run_db(get_web_crawl_urls, request.user_id)
         return JSONResponse(
             status_code=200,
             content={
@@ -261,7 +262,7 @@ async def upload_documents(
         
         if processed_docs:
             # Update user's documents array
-            update_user_documents(user_id, processed_docs)
+            await run_db(update_user_documents, user_id, processed_docs)
             
             return JSONResponse(
                 status_code=200,
@@ -295,7 +296,7 @@ async def fetch_documents(request: FetchDocumentsRequest):
         FetchDocumentsResponse - List of document names
     """
     try:
-        documents = get_user_documents(request.user_id)
+        documents = await run_db(get_user_documents, request.user_id)
         return JSONResponse(
             status_code=200,
             content={"documents": documents}
@@ -0,0 +1,36 @@
+import traceback
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from utils.embedding_cache import embedding_cache
+from utils.query_classifier import get_classifier_stats
+from utils.pubmed_store import pubmed_store
+from utils.settings_cache import settings_cache
+from utils.answer_cache import answer_cache
+from utils.logger import logger
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def metrics_api():
+    """
+    Report cache and fast-path counters for this worker process
+
+    Returns:
+        JSONResponse - JSON response
+    """
+    try:
+        return JSONResponse(
+            status_code=200,
+            content={
+                "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+                "query_classifier": get_classifier_stats(),
+                "pubmed_store": pubmed_store.stats() if pubmed_store is not None else None,
+                "settings_cache": settings_cache.stats() if settings_cache is not None else None,
+                "answer_cache": answer_cache.stats() if answer_cache is not None else None
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error getting metrics: {traceback.format_exc()}")
+        return JSONResponse(status_code=500, content={"message": str(e)})
@@ -1,25 +1,338 @@
+import os
 import traceback
 import json
 import uuid
+import time
+import asyncio
 
 from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from schemas.query_schema import QueryRequest, QueryResponse, QueryHistoryRequest, QueryHistoryResponse, BubbleGraphDetailsRequest,\
 BubbleGraphDetailsResponse, DescriptiveAnalysisRequest, DescriptiveAnalysisResponse, SaveSettingsRequest, SaveSettingsResponse, GetSettingsRequest, GetSettingsResponse ,\
 GetLatestRelevantPublicationsRequest, GetLatestRelevantPublicationsResponse
-from utils.logger import log_performance, logger
-from utils.openai_funcs import get_openai_response
+from utils.logger import log_performance, log_stream_performance, logger
+from utils.openai_funcs import get_openai_response_async, stream_openai_response, get_embeddings
 from utils.constants import QUERY_CLASSIFICATION_USER_PROMPT, QUERY_CLASSIFICATION_SYSTEM_PROMPT , \
 GREET_USER_PROMPT, GREET_SYSTEM_PROMPT, RESPONSE_GENERATION_USER_PROMPT, RESPONSE_GENERATION_SYSTEM_PROMPT , \
-COST_EFFECTIVE_ANALYSIS_SYSTEM_PROMPT , COST_EFFECTIVE_ANALYSIS_USER_PROMPT
-from utils.pinecone_funcs import retrieve_chunks
+COST_EFFECTIVE_ANALYSIS_SYSTEM_PROMPT , COST_EFFECTIVE_ANALYSIS_USER_PROMPT , GARBAGE_RESPONSE
+from utils.pinecone_funcs import retrieve_chunks, SHARED_NAMESPACE, SHARED_CORPUS_RETRIEVAL_ENABLED
+from utils.answer_cache import answer_cache, make_answer_key
+from utils.query_classifier import classify_query_locally
 from utils.helpers import retreive_articles, retreive_modality_count
+from utils.publication_feed import refresh_user_feed
 from utils.db_operations import insert_query_history, retrieve_query_history, retrieve_descriptive_analysis, save_chatbot_settings , get_chatbot_settings ,\
-      get_saved_articles_ids , get_articles_from_query_history 
+      get_publication_feed , decode_history_cursor
+from utils.db_pool import run_db
 
 router = APIRouter()
 
+# Start knowledge base retrieval while the LLM classifies uncertain queries
+SPECULATIVE_RETRIEVAL_ENABLED = os.getenv("SPECULATIVE_RETRIEVAL_ENABLED", "true").lower() == "true"
+# Concurrent PubMed searches and overall time budget (seconds) for /get_latest_relevant_publications
+LATEST_PUBLICATIONS_CONCURRENCY = int(os.getenv("LATEST_PUBLICATIONS_CONCURRENCY", "5"))
+LATEST_PUBLICATIONS_BUDGET = float(os.getenv("LATEST_PUBLICATIONS_BUDGET", "10"))
+# Number of stored feed entries returned by /get_latest_relevant_publications
+LATEST_PUBLICATIONS_LIMIT = int(os.getenv("LATEST_PUBLICATIONS_LIMIT", "50"))
+
+async def classify_query_with_llm(request: QueryRequest) -> str:
+    """
+    Classify the query with the LLM
+
+    Args:
+        request: QueryRequest
+
+    Returns:
+        str - One of garbage, greet, cost_effective_analysis, actual
+    """
+    settings = request.settings
+    type = await get_openai_response_async(
+        messages=[
+            {
+                "role": "system",
+                "content": QUERY_CLASSIFICATION_SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": QUERY_CLASSIFICATION_USER_PROMPT.format(
+                    query=request.query,
+                    language=settings.language,
+                    tonality=settings.tonality
+                )
+            }
+        ],
+        is_json=True
+    )
+    return json.loads(type)['type']
+
+async def retrieve_query_chunks(request: QueryRequest, timings: dict, started: float) -> list[str]:
+    """
+    Retrieve knowledge base chunks for the query in a worker thread,
+    recording when retrieval started and finished relative to started
+
+    Args:
+        request: QueryRequest
+        timings: dict - Receives retrieval_start and retrieval_end in ms
+        started: float - time.perf_counter() at the start of the request
+
+    Returns:
+        list[str] - Retrieved chunks, or None
+    """
+    timings["retrieval_start"] = (time.perf_counter() - started) * 1000
+    chunks = await asyncio.to_thread(
+        retrieve_chunks,
+        namespace=request.user_id,
+        query=request.query
+    )
+    timings["retrieval_end"] = (time.perf_counter() - started) * 1000
+    return chunks
+
+async def classify_and_retrieve(request: QueryRequest, local: tuple = None) -> tuple[str, list[str]]:
+    """
+    Classify the query and, for knowledge base queries, retrieve context.
+    The local classifier decides first. When it is unsure, retrieval is
+    started speculatively alongside the LLM classification call and its
+    result is discarded if the query turns out not to need it.
+
+    Args:
+        request: QueryRequest
+        local: tuple - classify_query_locally result when the caller already has it
+
+    Returns:
+        tuple - (query type, chunks or None)
+    """
+    started = time.perf_counter()
+    timings = {}
+
+    # Cheap local classification first, the LLM only when it is unsure
+    type, confidence, source = local if local is not None else classify_query_locally(request.query)
+    if type is not None:
+        logger.info(f"Query classified as {type} by {source} (confidence {confidence:.2f})")
+        chunks = await retrieve_query_chunks(request, timings, started) if type == "actual" else None
+        return type, chunks
+
+    retrieval = None
+    if SPECULATIVE_RETRIEVAL_ENABLED:
+        retrieval = asyncio.create_task(retrieve_query_chunks(request, timings, started))
+        # Consume the outcome so a discarded retrieval that failed is not reported as unhandled
+        retrieval.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    try:
+        type = await classify_query_with_llm(request)
+    except BaseException:
+        if retrieval is not None:
+            retrieval.cancel()
+        raise
+    timings["classification_end"] = (time.perf_counter() - started) * 1000
+    logger.info(f"Query classified as {type} by llm (local confidence {confidence:.2f}) in {timings['classification_end']:.1f} ms")
+
+    if type != "actual":
+        if retrieval is not None:
+            retrieval.cancel()
+            logger.info("Discarded speculative retrieval for non knowledge base query")
+        return type, None
+
+    if retrieval is None:
+        return type, await retrieve_query_chunks(request, timings, started)
+
+    chunks = await retrieval
+    overlap = max(0.0, min(timings["classification_end"], timings["retrieval_end"]) - timings["retrieval_start"])
+    logger.info(
+        f"Speculative retrieval: classification {timings['classification_end']:.1f} ms, "
+        f"retrieval {timings['retrieval_start']:.1f}-{timings['retrieval_end']:.1f} ms, "
+        f"overlap {overlap:.1f} ms, total {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+    return type, chunks
+
+# Query types whose answers are cached
+CACHED_ANSWER_TYPES = ("greet", "actual")
+
+def _answer_namespaces(request: QueryRequest) -> list[str]:
+    namespaces = [request.user_id]
+    if SHARED_CORPUS_RETRIEVAL_ENABLED:
+        namespaces.append(SHARED_NAMESPACE)
+    return namespaces
+
+def _answer_key(request: QueryRequest, type: str) -> tuple:
+    settings = request.settings
+    # Greetings do not depend on the user's documents, so all users share them
+    namespace = request.user_id if type == "actual" else None
+    return make_answer_key(type, namespace, settings.language, settings.tonality, settings.tokens)
+
+async def lookup_cached_answer(request: QueryRequest, local_type: str) -> tuple[list, dict, dict]:
+    """
+    Look the query up in the semantic answer cache. Only the first message
+    of a conversation is cached: with earlier messages the answer depends
+    on more than the query. Queries the local classifier already placed in
+    a type that is not cached skip the cache and its query embedding.
+
+    Args:
+        request: QueryRequest
+        local_type: str - Type from classify_query_locally, None when it was unsure
+
+    Returns:
+        tuple - (query embedding, or None when the cache does not apply;
+        namespace versions to store the answer with; cached answer or None)
+    """
+    if answer_cache is None or request.messages:
+        return None, None, None
+    if local_type is not None and local_type not in CACHED_ANSWER_TYPES:
+        return None, None, None
+    # Taken before retrieval, so an answer built from chunks that change
+    # while it is generated is not stored as fresh
+    versions = answer_cache.versions(_answer_namespaces(request))
+    # Cached by the embedding cache, so retrieval does not embed the query again
+    vector = await asyncio.to_thread(get_embeddings, request.query)
+    if not isinstance(vector, list):
+        return None, None, None
+    types = [local_type] if local_type is not None else CACHED_ANSWER_TYPES
+    cached = answer_cache.get([_answer_key(request, type) for type in types], vector)
+    return vector, versions, cached
+
+def store_cached_answer(request: QueryRequest, vector: list, versions: dict, type: str, message: str):
+    """
+    Cache a greet or knowledge base answer. Knowledge base answers go stale
+    when a namespace they were retrieved from is written to.
+
+    Args:
+        request: QueryRequest
+        vector: list - Query embedding from lookup_cached_answer, None to skip caching
+        versions: dict - Namespace versions from lookup_cached_answer
+        type: str - Query type
+        message: str - The answer
+    """
+    # Completion failures come back as an error dict, which must not be cached
+    if vector is None or type not in CACHED_ANSWER_TYPES or not isinstance(message, str) or not message:
+        return
+    answer_cache.set(
+        _answer_key(request, type),
+        vector,
+        {"type": type, "message": message},
+        versions if type == "actual" else {}
+    )
+
+def build_greet_messages(request: QueryRequest) -> list[dict]:
+    """
+    Append the greeting prompts to the conversation
+
+    Args:
+        request: QueryRequest
+
+    Returns:
+        list[dict] - Messages for the completion call
+    """
+    settings = request.settings
+    request.messages.append(
+        {
+            "role": "system",
+            "content": GREET_SYSTEM_PROMPT
+        }
+    )
+    request.messages.append(
+        {
+            "role": "user",
+            "content": GREET_USER_PROMPT.format(
+                query=request.query,
+                language=settings.language,
+                tonality=settings.tonality
+            )
+        }
+    )
+    return request.messages
+
+def build_rag_messages(request: QueryRequest, chunks: list[str]) -> list[dict]:
+    """
+    Append the retrieval augmented generation prompts to the conversation
+
+    Args:
+        request: QueryRequest
+        chunks: list[str] - Retrieved context chunks, or None
+
+    Returns:
+        list[dict] - Messages for the completion call
+    """
+    settings = request.settings
+    context = '\n'.join(chunks) if chunks is not None else ""
+
+    request.messages.append(
+        {
+            "role": "system",
+            "content": RESPONSE_GENERATION_SYSTEM_PROMPT
+        }
+    )
+    request.messages.append(
+        {
+            "role": "user",
+            "content": RESPONSE_GENERATION_USER_PROMPT.format(
+                context=context,
+                query=request.query,
+                language=settings.language,
+                tonality=settings.tonality
+            )
+        }
+    )
+    return request.messages
+
+async def cost_effective_analysis(request: QueryRequest) -> dict:
+    """
+    Run the cost effectiveness analysis over PubMed articles and store it in
+    the query history
+
+    Args:
+        request: QueryRequest
+
+    Returns:
+        dict - Pie chart, bar chart and per-article details from the model
+    """
+    settings = request.settings
+    articles_context, articles = await retreive_articles(request.query)
+
+    messages = []
+    messages.append(
+        {
+            "role": "system",
+            "content": COST_EFFECTIVE_ANALYSIS_SYSTEM_PROMPT,
+        }
+    )
+    messages.append(
+        {
+            "role": "user",
+            "content": COST_EFFECTIVE_ANALYSIS_USER_PROMPT.format(
+                query=request.query,
+                articles_context=articles_context,
+                language=settings.language,
+                tonality=settings.tonality   
+            )
+        }
+    )
+    response = await get_openai_response_async(
+        messages=messages,
+        is_json=True
+    )
+    response = json.loads(response)
+    articles_details = response['articles']
+
+    article_map = {article["article_id"]: article["abstract"] for article in articles}
+
+    for detail in articles_details:
+        detail["abstract"] = article_map.get(detail["article_id"], "No abstract found")
+
+    query_id = "query_"+str(uuid.uuid4())
+
+    pie_chart = response['pie_chart']
+    bar_chart = response['bar_chart']
+
+    await run_db(
+        insert_query_history,
+        request.user_id, 
+        query_id, 
+        request.query, 
+        articles_details,
+        pie_chart,
+        bar_chart
+    )
+    return response
+
 @log_performance
 @router.post("/query", response_model=QueryResponse)
 async def query_api(request: QueryRequest):
@@ -37,152 +350,149 @@ async def query_api(request: QueryRequest):
     try:
         # Get user's settings
         settings = request.settings
-        
-        type = get_openai_response(
-            messages=[
-                {
-                    "role": "system",
-                    "content": QUERY_CLASSIFICATION_SYSTEM_PROMPT
-                },
-                {
-                    "role": "user",
-                    "content": QUERY_CLASSIFICATION_USER_PROMPT.format(
-                        query=request.query,
-                        language=settings.language,
-                        tonality=settings.tonality
-                    )
-                }
-            ],
-            is_json=True
-        )
-        type = json.loads(type)['type']
+
+        local = classify_query_locally(request.query)
+        vector, versions, cached = await lookup_cached_answer(request, local[0])
+        if cached is not None:
+            logger.info(f"Answer cache hit for {cached['type']} query (similarity {cached['similarity']:.3f})")
+            return JSONResponse(content={"message": cached["message"], "is_graph": False})
+
+        type, chunks = await classify_and_retrieve(request, local)
 
         if type == "garbage":
-            response = "I guess you are typed some gibberish. Please type a valid query."
+            response = GARBAGE_RESPONSE
 
         elif type == "greet":
-            request.messages.append(
-                {
-                    "role": "system",
-                    "content": GREET_SYSTEM_PROMPT
-                }
-            )
-            request.messages.append(
-                {
-                    "role": "user",
-                    "content": GREET_USER_PROMPT.format(
-                        query=request.query,
-                        language=settings.language,
-                        tonality=settings.tonality
-                    )
-                }
-            )
-            response = get_openai_response(
-                messages=request.messages,
+            response = await get_openai_response_async(
+                messages=build_greet_messages(request),
                 is_json=False,
                 max_tokens=settings.tokens
             )
             
         elif type == "cost_effective_analysis":
-            articles_context, articles = retreive_articles(request.query)
-
-            messages = []
-            messages.append(
-                {
-                    "role": "system",
-                    "content": COST_EFFECTIVE_ANALYSIS_SYSTEM_PROMPT,
-                }
-            )
-            messages.append(
-                {
-                    "role": "user",
-                    "content": COST_EFFECTIVE_ANALYSIS_USER_PROMPT.format(
-                        query=request.query,
-                        articles_context=articles_context,
-                        language=settings.language,
-                        tonality=settings.tonality   
-                    )
-                }
-            )
-            response = get_openai_response(
-                messages=messages,
-                is_json=True
-            )
-            response = json.loads(response)
-            articles_details = response['articles']
-
-            article_map = {article["article_id"]: article["abstract"] for article in articles}
-
-            for detail in articles_details:
-                detail["abstract"] = article_map.get(detail["article_id"], "No abstract found")
-
-            query_id = "query_"+str(uuid.uuid4())
-
-            pie_chart = response['pie_chart']
-            bar_chart = response['bar_chart']
-
-            insert_query_history(
-                request.user_id, 
-                query_id, 
-                request.query, 
-                articles_details,
-                pie_chart,
-                bar_chart
-            )
+            response = await cost_effective_analysis(request)
             
         else:
-            chunks = retrieve_chunks(
-                namespace=request.user_id,
-                query=request.query
-            )
-
-            context = '\n'.join(chunks) if chunks is not None else ""
-
-            request.messages.append(
-                {
-                    "role": "system",
-                    "content": RESPONSE_GENERATION_SYSTEM_PROMPT
-                }
-            )
-            request.messages.append(
-                {
-                    "role": "user",
-                    "content": RESPONSE_GENERATION_USER_PROMPT.format(
-                        context=context,
-                        query=request.query,
-                        language=settings['language'],
-                        tonality=settings['tonality']
-                    )
-                }
-            )
-            response = get_openai_response(
-                messages=request.messages,
+            response = await get_openai_response_async(
+                messages=build_rag_messages(request, chunks),
                 is_json=False,
                 max_tokens=settings.tokens
             )
 
+        store_cached_answer(request, vector, versions, type, response)
         return JSONResponse(content={"message": response, "is_graph": type == "cost_effective_analysis"})
     except Exception as e:
         logger.error(f"Error in query router: {traceback.format_exc()}")
         return JSONResponse(content={"message": f"Internal Server Error {e}"}, status_code=500)
 
+@log_performance
+@router.post("/query_stream")
+async def query_stream_api(request: QueryRequest):
+    """
+    Streaming variant of /query. The response is newline delimited JSON:
+    a {"type": "classification"} event, then either {"type": "delta"} events
+    carrying pieces of the answer (greet and knowledge base queries) or a
+    single {"type": "message"} event (garbage and cost effectiveness
+    queries), and finally {"type": "done"}. Failures are reported as a
+    {"type": "error"} event.
 
+    Args:
+        request: QueryRequest
+
+    Returns:
+        StreamingResponse - application/x-ndjson
+    """
+    def event(payload: dict) -> str:
+        return json.dumps(payload) + "\n"
+
+    async def generate():
+        try:
+            settings = request.settings
+
+            local = classify_query_locally(request.query)
+            vector, versions, cached = await lookup_cached_answer(request, local[0])
+            if cached is not None:
+                yield event({"type": "classification", "query_type": cached["type"], "is_graph": False})
+                yield event({"type": "delta", "content": cached["message"]})
+                yield event({"type": "done"})
+                return
+
+            type, chunks = await classify_and_retrieve(request, local)
+            is_graph = type == "cost_effective_analysis"
+            yield event({"type": "classification", "query_type": type, "is_graph": is_graph})
+
+            if type == "garbage":
+                yield event({"type": "message", "message": GARBAGE_RESPONSE, "is_graph": is_graph})
+
+            elif type == "cost_effective_analysis":
+                response = await cost_effective_analysis(request)
+                yield event({"type": "message", "message": response, "is_graph": is_graph})
+
+            else:
+                if type == "greet":
+                    messages = build_greet_messages(request)
+                else:
+                    messages = build_rag_messages(request, chunks)
+
+                pieces = []
+                async for content in stream_openai_response(messages, max_tokens=settings.tokens):
+                    pieces.append(content)
+                    yield event({"type": "delta", "content": content})
+                store_cached_answer(request, vector, versions, type, "".join(pieces))
+
+            yield event({"type": "done"})
+        except Exception as e:
+            logger.error(f"Error in query stream router: {traceback.format_exc()}")
+            yield event({"type": "error", "message": f"Internal Server Error {e}"})
+
+    return StreamingResponse(log_stream_performance(generate(), "query_stream_api"), media_type="application/x-ndjson")
 
 @log_performance
 @router.post("/query_history", response_model=QueryHistoryResponse)
 async def query_history_api(request: QueryHistoryRequest):
     """
-    This API is used to retrieve the query history from the database.
+    This API is used to retrieve the query history from the database, one
+    keyset paginated page at a time. Pass next_cursor back as cursor to get
+    the next page. With stream=True every query from the cursor onwards is
+    streamed as NDJSON {"type": "query"} events, fetched a page at a time,
+    followed by {"type": "done"}.
 
     Args:
         request: QueryHistoryRequest
 
     Returns:
-        QueryHistoryResponse
+        QueryHistoryResponse, or StreamingResponse - application/x-ndjson
     """
     try:
-        query_history = retrieve_query_history(request.user_id)
-        return JSONResponse(content={"message": query_history})
+        if request.cursor:
+            decode_history_cursor(request.cursor)
+    except ValueError as e:
+        return JSONResponse(content={"message": str(e)}, status_code=400)
+
+    if request.stream:
+        async def generate():
+            cursor = request.cursor
+            try:
+                while True:
+                    queries, cursor = await run_db(
+                        retrieve_query_history, request.user_id, cursor, request.limit, request.include_abstracts
+                    )
+                    for query in queries:
+                        yield json.dumps({"type": "query", **query}) + "\n"
+                    if cursor is None:
+                        break
+                yield json.dumps({"type": "done"}) + "\n"
+            except Exception as e:
+                logger.error(f"Error in query history stream: {traceback.format_exc()}")
+                yield json.dumps({"type": "error", "message": f"Internal Server Error {e}"}) + "\n"
+
+        return StreamingResponse(log_stream_performance(generate(), "query_history_api"), media_type="application/x-ndjson")
+
+    try:
+        query_history, next_cursor = await run_db(
+            retrieve_query_history, request.user_id, request.cursor, request.limit, request.include_abstracts
+        )
+        return JSONResponse(content={"message": query_history, "next_cursor": next_cursor})
     except Exception as e:
         logger.error(f"Error in query history router: {traceback.format_exc()}")
         return JSONResponse(content={"message": f"Internal Server Error {e}"}, status_code=500)
@@ -200,7 +510,7 @@ async def bubble_graph_details_api(request: BubbleGraphDetailsRequest):
         BubbleGraphDetailsResponse
     """
     try:
-        modality_count , articles_details = retreive_modality_count(request.query_id)
+        modality_count , articles_details = await run_db(retreive_modality_count, request.query_id)
         return JSONResponse(content={"modality_count": modality_count, "articles_details": articles_details})
     except Exception as e:
         logger.error(f"Error in bubble graph details router: {traceback.format_exc()}")
@@ -219,7 +529,7 @@ async def get_descriptive_analysis_api(request: DescriptiveAnalysisRequest):
         DescriptiveAnalysisResponse
     """
     try:
-        pie_chart , bar_chart = retrieve_descriptive_analysis(request.query_id)
+        pie_chart , bar_chart = await run_db(retrieve_descriptive_analysis, request.query_id)
         return JSONResponse(content={"pie_chart": pie_chart, "bar_chart": bar_chart})
     except Exception as e:
         logger.error(f"Error in get descriptive analysis router: {traceback.format_exc()}")
@@ -238,7 +548,8 @@ async def save_settings_api(request: SaveSettingsRequest):
         SaveSettingsResponse - Success message
     """
     try:
-        result = save_chatbot_settings(
+        result = await run_db(
+            save_chatbot_settings,
             user_id=request.user_id,
             tonality=request.settings.tonality,
             language=request.settings.language,
@@ -276,7 +587,7 @@ async def get_settings_api(request: GetSettingsRequest):
         GetSettingsResponse - Chatbot settings
     """
     try:
-        settings = get_chatbot_settings(request.user_id)
+        settings = await run_db(get_chatbot_settings, request.user_id)
         return JSONResponse(content={"settings": settings}, status_code=200)
     except Exception as e:
         logger.error(f"Error in get settings router: {traceback.format_exc()}")
@@ -290,17 +601,19 @@ async def get_latest_relevant_publications_api(request: GetLatestRelevantPublica
     Get latest relevant publications for a user
     """
     try:
-        saved_articles_ids = get_saved_articles_ids(request.user_id)
-
-        articles_details = get_articles_from_query_history(saved_articles_ids)
-
-        lastest_relevant_publications =  []
-
-        for article in articles_details:
-            _ , latest_relevant_publications = retreive_articles(article[8], article[7])
-            lastest_relevant_publications.extend(latest_relevant_publications)
+        # The feed is kept up to date by the background refresher; search
+        # inline only when asked to or when the user has no feed yet
+        is_complete = True
+        lastest_relevant_publications = await run_db(get_publication_feed, request.user_id, LATEST_PUBLICATIONS_LIMIT)
+        if request.refresh or not lastest_relevant_publications:
+            is_complete = await refresh_user_feed(
+                request.user_id,
+                concurrency=LATEST_PUBLICATIONS_CONCURRENCY,
+                budget=LATEST_PUBLICATIONS_BUDGET
+            )
+            lastest_relevant_publications = await run_db(get_publication_feed, request.user_id, LATEST_PUBLICATIONS_LIMIT)
         
-        return JSONResponse(content={"lastest_relevant_publications": lastest_relevant_publications})
+        return JSONResponse(content={"lastest_relevant_publications": lastest_relevant_publications, "is_complete": is_complete})
     except Exception as e:
         logger.error(f"Error in get latest relevant publications router: {traceback.format_exc()}")
         return JSONResponse(content={"message": f"Internal Server Error {e}"}, status_code=500)
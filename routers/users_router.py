@@ -9,11 +9,11 @@ from utils.db_operations import (
     save_articles, 
     get_articles_abstract, 
     get_user_email,
-    check_user_exists,
-    check_email_exists
+    DuplicateUserError
 )
+from utils.db_pool import run_db
 from utils.email_utils import send_email_with_pdf
-from utils.pinecone_funcs import transfer_vectors_from_default_namespace
+from utils.pinecone_funcs import transfer_vectors_from_default_namespace, COPY_SHARED_CORPUS_ON_SIGNUP
 from utils.logger import logger
 
 router = APIRouter()
@@ -45,22 +45,9 @@ async def create_user_api(request: User, background_tasks: BackgroundTasks):
         JSONResponse - JSON response
     """
     try:
-        # Check if user already exists
-        if check_user_exists(request.user_id):
-            return JSONResponse(
-                status_code=400,
-                content={"message": "User ID already exists"}
-            )
-            
-        # Check if email is already registered
-        if check_email_exists(request.email):
-            return JSONResponse(
-                status_code=400,
-                content={"message": "Email already registered"}
-            )
-            
-        # Create user
-        response = create_user(
+        # A single INSERT; the unique indexes on user_id and email reject duplicates
+        response = await run_db(
+            create_user,
             user_id=request.user_id,
             first_name=request.first_name,
             last_name=request.last_name,
@@ -70,8 +57,10 @@ async def create_user_api(request: User, background_tasks: BackgroundTasks):
         )
         
         if response:
-            # Transfer vectors in background
-            background_tasks.add_task(transfer_vectors_background, request.user_id)
+            # The shared corpus is searched directly at query time unless
+            # signup copies are still enabled
+            if COPY_SHARED_CORPUS_ON_SIGNUP:
+                background_tasks.add_task(transfer_vectors_background, request.user_id)
             return JSONResponse(
                 status_code=200,
                 content={"message": "User created successfully"}
@@ -82,6 +71,11 @@ async def create_user_api(request: User, background_tasks: BackgroundTasks):
                 content={"message": "Failed to create user"}
             )
             
+    except DuplicateUserError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"message": "Email already registered" if e.field == "email" else "User ID already exists"}
+        )
     except Exception as e:
         logger.error(f"Error creating user: {traceback.format_exc()}")
         return JSONResponse(
@@ -95,7 +89,8 @@ async def save_articles_api(request: SaveArticles):
     Save articles in the database
     """
     try:
-        response = save_articles(
+        response = await run_db(
+            save_articles,
             user_id=request.user_id,
             article_ids=request.article_ids
         )
@@ -119,7 +114,7 @@ async def get_articles_abstract_api(request: GetArticlesAbstract):
         JSONResponse - JSON response
     """
     try:
-        response = get_articles_abstract(request.article_ids)  
+        response = await run_db(get_articles_abstract, request.article_ids)  
         return JSONResponse(status_code=200, content={"data": response})
     except Exception as e:
         logger.error(f"Error getting saved articles: {traceback.format_exc()}")
@@ -144,7 +139,7 @@ async def send_email_api(
     """
     try:
         # Get user's email from database
-        user_email = get_user_email(user_id)
+        user_email = await run_db(get_user_email, user_id)
         if not user_email:
             return JSONResponse(status_code=404, content={"message": "User email not found"})
 
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 class QueryResponse(BaseModel):
@@ -5,9 +7,14 @@ class QueryResponse(BaseModel):
 
 class QueryHistoryRequest(BaseModel):
     user_id: str
+    cursor: Optional[str] = Field(default=None, description="next_cursor from the previous page, omit for the newest queries")
+    limit: int = Field(default=20, ge=1, le=100, description="Number of queries per page")
+    include_abstracts: bool = False
+    stream: bool = Field(default=False, description="Stream every query from the cursor onwards as NDJSON")
 
 class QueryHistoryResponse(BaseModel):
     message: list[dict]
+    next_cursor: Optional[str] = None
 
 class BubbleGraphDetailsRequest(BaseModel):
     query_id: str
@@ -48,7 +55,9 @@ class GetSettingsResponse(BaseModel):
 
 class GetLatestRelevantPublicationsRequest(BaseModel):
     user_id: str
+    refresh: bool = False
 
 class GetLatestRelevantPublicationsResponse(BaseModel):
     lastest_relevant_publications: list[dict]
+    is_complete: bool = True
 
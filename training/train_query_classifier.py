@@ -0,0 +1,195 @@
+"""
+Train and evaluate the local query classifier used ahead of the LLM in
+/query, and write the model artifact it loads.
+
+Run from the repository root:
+
+    python -m training.train_query_classifier
+    python -m training.train_query_classifier --extra logged_queries.jsonl
+
+Each data file is JSON lines of {"query": str, "label": str} with labels
+from utils.query_classifier.LABELS. The script holds out part of the data,
+reports how the rules and the model do on it, picks the lowest confidence
+threshold that keeps held-out precision at or above --target-precision,
+then retrains on everything and writes the artifact with that threshold.
+"""
+import os
+import json
+import math
+import random
+import argparse
+from collections import Counter
+
+from utils.query_classifier import LABELS, QueryClassifierModel, extract_features, rule_classify
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_DATA = os.path.join(ROOT, "training", "data", "query_classification.jsonl")
+DEFAULT_OUTPUT = os.path.join(ROOT, "artifacts", "query_classifier.json")
+
+def load_examples(paths: list[str]) -> list[dict]:
+    examples = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    example = json.loads(line)
+                    if example["label"] not in LABELS:
+                        raise ValueError(f"Unknown label {example['label']!r} in {path}")
+                    examples.append(example)
+    return examples
+
+def stratified_split(examples: list[dict], holdout: float, seed: int) -> tuple[list[dict], list[dict]]:
+    rng = random.Random(seed)
+    train, test = [], []
+    for label in LABELS:
+        group = [example for example in examples if example["label"] == label]
+        rng.shuffle(group)
+        cut = int(round(len(group) * holdout))
+        test.extend(group[:cut])
+        train.extend(group[cut:])
+    rng.shuffle(train)
+    return train, test
+
+def fit(examples: list[dict], min_df: int, epochs: int, learning_rate: float, l2: float, seed: int) -> dict:
+    """
+    Build the vocabulary and IDF table, then fit a softmax regression with SGD
+
+    Returns:
+        dict - Artifact without the threshold
+    """
+    feature_sets = [extract_features(example["query"]) for example in examples]
+    document_frequency = Counter()
+    for features in feature_sets:
+        document_frequency.update(features.keys())
+
+    vocabulary = {}
+    for feature, df in sorted(document_frequency.items()):
+        if df >= min_df:
+            vocabulary[feature] = len(vocabulary)
+
+    n = len(examples)
+    idf = [0.0] * len(vocabulary)
+    for feature, index in vocabulary.items():
+        idf[index] = math.log((1 + n) / (1 + document_frequency[feature])) + 1
+
+    artifact = {
+        "labels": LABELS,
+        "vocabulary": vocabulary,
+        "idf": idf,
+        "weights": [[0.0] * len(vocabulary) for _ in LABELS],
+        "bias": [0.0] * len(LABELS),
+        "threshold": 1.0
+    }
+    model = QueryClassifierModel(artifact)
+    vectors = [model.vectorize(example["query"]) for example in examples]
+    targets = [LABELS.index(example["label"]) for example in examples]
+
+    rng = random.Random(seed)
+    order = list(range(n))
+    for epoch in range(epochs):
+        rng.shuffle(order)
+        rate = learning_rate / (1 + epoch * 0.1)
+        for i in order:
+            vector, target = vectors[i], targets[i]
+            scores = [
+                bias + sum(weights[index] * value for index, value in vector.items())
+                for weights, bias in zip(model.weights, model.bias)
+            ]
+            top = max(scores)
+            exps = [math.exp(score - top) for score in scores]
+            total = sum(exps)
+            for k, exp in enumerate(exps):
+                error = exp / total - (1.0 if k == target else 0.0)
+                weights = model.weights[k]
+                for index, value in vector.items():
+                    weights[index] -= rate * (error * value + l2 * weights[index])
+                model.bias[k] -= rate * error
+
+    return artifact
+
+def evaluate(model: QueryClassifierModel, examples: list[dict], target_precision: float) -> dict:
+    """
+    Score held-out examples with the same rules -> model -> fallback order
+    used at serving time, and choose the confidence threshold
+
+    Returns:
+        dict - Metrics and the chosen threshold
+    """
+    rule_correct = rule_total = 0
+    model_predictions = []
+    for example in examples:
+        label = rule_classify(example["query"])
+        if label is not None:
+            rule_total += 1
+            rule_correct += label == example["label"]
+            continue
+        probabilities = model.predict_proba(example["query"])
+        best = max(probabilities, key=probabilities.get)
+        model_predictions.append((probabilities[best], best == example["label"]))
+
+    thresholds = [round(0.30 + 0.01 * step, 2) for step in range(70)]
+    curve = []
+    chosen = 0.99
+    for threshold in thresholds:
+        decided = [correct for confidence, correct in model_predictions if confidence >= threshold]
+        precision = sum(decided) / len(decided) if decided else 1.0
+        curve.append({"threshold": threshold, "model_coverage": len(decided) / max(len(model_predictions), 1), "precision": precision})
+    for point in curve:
+        if point["precision"] >= target_precision:
+            chosen = point["threshold"]
+            break
+
+    decided = [correct for confidence, correct in model_predictions if confidence >= chosen]
+    total = len(examples)
+    return {
+        "examples": total,
+        "rules_coverage": rule_total / total,
+        "rules_precision": rule_correct / rule_total if rule_total else None,
+        "model_accuracy_without_threshold": sum(correct for _, correct in model_predictions) / max(len(model_predictions), 1),
+        "threshold": chosen,
+        "model_precision_at_threshold": sum(decided) / len(decided) if decided else None,
+        "local_accuracy": (rule_correct + sum(decided)) / max(rule_total + len(decided), 1),
+        "expected_fallback_rate": (len(model_predictions) - len(decided)) / total,
+        "curve": curve
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=DEFAULT_DATA)
+    parser.add_argument("--extra", nargs="*", default=[], help="Additional labelled JSONL files, e.g. logged LLM classifications")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--min-df", type=int, default=1)
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--learning-rate", type=float, default=0.5)
+    parser.add_argument("--l2", type=float, default=1e-4)
+    parser.add_argument("--target-precision", type=float, default=0.97)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    examples = load_examples([args.data] + args.extra)
+    print(f"Loaded {len(examples)} examples: {dict(Counter(example['label'] for example in examples))}")
+
+    train, test = stratified_split(examples, args.holdout, args.seed)
+    artifact = fit(train, args.min_df, args.epochs, args.learning_rate, args.l2, args.seed)
+    metrics = evaluate(QueryClassifierModel(artifact), test, args.target_precision)
+
+    print(f"Held-out examples:          {metrics['examples']}")
+    print(f"Rules coverage / precision: {metrics['rules_coverage']:.3f} / {metrics['rules_precision']}")
+    print(f"Model accuracy (no cutoff): {metrics['model_accuracy_without_threshold']:.3f}")
+    print(f"Chosen threshold:           {metrics['threshold']}")
+    print(f"Model precision at cutoff:  {metrics['model_precision_at_threshold']}")
+    print(f"Local stage accuracy:       {metrics['local_accuracy']:.3f}")
+    print(f"Expected LLM fallback rate: {metrics['expected_fallback_rate']:.3f}")
+
+    artifact = fit(examples, args.min_df, args.epochs, args.learning_rate, args.l2, args.seed)
+    artifact["threshold"] = metrics["threshold"]
+    artifact["eval"] = {key: value for key, value in metrics.items() if key != "curve"}
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, ensure_ascii=False, separators=(",", ":"))
+    print(f"Wrote {args.output} ({len(artifact['vocabulary'])} features)")
+
+if __name__ == "__main__":
+    main()
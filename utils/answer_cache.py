@@ -0,0 +1,288 @@
+import os
+import time
+import itertools
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.logger import logger
+
+load_dotenv()
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# Minimum cosine similarity between query embeddings for a stored answer to be reused
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.96"))
+# Seconds an answer is served. Namespaces written by another process (other
+# workers, ingestion scripts) only reach this worker's cache through the
+# invalidation hooks, so this also bounds how stale such an answer can get.
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ITEMS = int(os.getenv("ANSWER_CACHE_MAX_ITEMS", "10000"))
+# Width of the tonality (0-100) ranges that share cached answers
+ANSWER_CACHE_TONALITY_BUCKET = int(os.getenv("ANSWER_CACHE_TONALITY_BUCKET", "20"))
+
+def make_answer_key(
+    type: str,
+    namespace: Optional[str],
+    language: str,
+    tonality: int,
+    tokens: int
+) -> tuple:
+    """
+    The partition an answer is cached in: answers are only reused for the
+    same query type, namespace, language, token limit and tonality bucket
+
+    Args:
+        type: str - Query type
+        namespace: Optional[str] - Namespace the answer was retrieved from,
+            None for answers that do not depend on one, which every user shares
+
+    Returns:
+        tuple - Partition key
+    """
+    return (type, namespace, language.strip().lower(), tonality // max(ANSWER_CACHE_TONALITY_BUCKET, 1), tokens)
+
+class _Partition:
+    """
+    Answers sharing one key. Their query embeddings are rows of a
+    preallocated matrix that grows by doubling, so a lookup is one
+    matrix-vector product and a store writes one row in place. Removing
+    moves the last row into the gap.
+    """
+
+    def __init__(self, dimension: int):
+        self.matrix = np.empty((16, dimension), dtype=np.float32)
+        self.count = 0
+        self.ids = []
+        self.entries = []
+        self.positions = {}
+
+    def add(self, entry_id: int, vector: np.ndarray, entry: dict):
+        if self.count == len(self.matrix):
+            matrix = np.empty((2 * len(self.matrix), self.matrix.shape[1]), dtype=np.float32)
+            matrix[:self.count] = self.matrix[:self.count]
+            self.matrix = matrix
+        self.matrix[self.count] = vector
+        self.ids.append(entry_id)
+        self.entries.append(entry)
+        self.positions[entry_id] = self.count
+        self.count += 1
+
+    def remove(self, entry_id: int):
+        position = self.positions.pop(entry_id)
+        last = self.count - 1
+        if position != last:
+            self.matrix[position] = self.matrix[last]
+            self.ids[position] = self.ids[last]
+            self.entries[position] = self.entries[last]
+            self.positions[self.ids[position]] = position
+        self.ids.pop()
+        self.entries.pop()
+        self.count -= 1
+
+    def scores(self, vector: np.ndarray) -> np.ndarray:
+        return self.matrix[:self.count] @ vector
+
+class AnswerCache:
+    """
+    Thread safe in-process semantic cache of generated answers. A lookup
+    returns the stored answer whose query embedding is most similar to the
+    new one, if that similarity reaches the threshold, the entry has not
+    expired and none of the namespaces it was answered from changed since.
+    Namespace changes bump a version number, which makes the answers built
+    on the old contents stale without scanning for them. The least recently
+    used answer is evicted when full.
+    """
+
+    def __init__(self, ttl: float, max_items: int, threshold: float):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.threshold = threshold
+        self._partitions = {}
+        self._lru = OrderedDict()
+        self._versions = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "expired": 0,
+            "stale": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+    @staticmethod
+    def _normalize(vector: list) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _remove(self, key: tuple, entry_id: int):
+        partition = self._partitions[key]
+        partition.remove(entry_id)
+        self._lru.pop(entry_id, None)
+        if partition.count == 0:
+            del self._partitions[key]
+
+    def _is_live(self, entry: dict, now: float) -> bool:
+        if entry["expires_at"] <= now:
+            self._counters["expired"] += 1
+            return False
+        if any(self._versions.get(name, 0) != version for name, version in entry["versions"].items()):
+            self._counters["stale"] += 1
+            return False
+        return True
+
+    def _nearest(self, key: tuple, vector: np.ndarray) -> tuple[Optional[int], float]:
+        """
+        The most similar live entry of a partition that reaches the
+        threshold. Expiry and staleness are only checked for those
+        candidates, best first, dropping the dead ones on the way; the
+        rest are left for the LRU bound to evict.
+
+        Returns:
+            tuple - (entry id or None, similarity)
+        """
+        partition = self._partitions.get(key)
+        if partition is None:
+            return None, 0.0
+        scores = partition.scores(vector)
+        candidates = np.flatnonzero(scores >= self.threshold)
+        # Collect ids first: removing an entry moves rows around
+        ranked = [(partition.ids[i], float(scores[i])) for i in candidates[np.argsort(-scores[candidates])]]
+        now = time.monotonic()
+        for entry_id, similarity in ranked:
+            if self._is_live(partition.entries[partition.positions[entry_id]], now):
+                return entry_id, similarity
+            self._remove(key, entry_id)
+            if key not in self._partitions:
+                break
+        return None, 0.0
+
+    def get(self, keys: list[tuple], vector: list) -> Optional[dict]:
+        """
+        Args:
+            keys: list[tuple] - Partitions to search, from make_answer_key
+            vector: list - Embedding of the query
+
+        Returns:
+            dict - The most similar cached value plus its similarity, or None
+        """
+        vector = self._normalize(vector)
+        with self._lock:
+            found = None
+            for key in keys:
+                entry_id, similarity = self._nearest(key, vector)
+                if entry_id is not None and (found is None or similarity > found[2]):
+                    found = (key, entry_id, similarity)
+            if found is None:
+                self._counters["misses"] += 1
+                return None
+            key, entry_id, similarity = found
+            partition = self._partitions[key]
+            self._lru.move_to_end(entry_id)
+            self._counters["hits"] += 1
+            return dict(partition.entries[partition.positions[entry_id]]["value"], similarity=similarity)
+
+    def versions(self, namespaces: list[str]) -> dict:
+        """
+        Current versions of namespaces. Take them before retrieving and pass
+        them to set, so an answer built from chunks that changed meanwhile
+        is stored as already stale.
+
+        Returns:
+            dict - namespace -> version
+        """
+        with self._lock:
+            return {name: self._versions.get(name, 0) for name in namespaces}
+
+    def set(self, key: tuple, vector: list, value: dict, versions: dict):
+        """
+        Store an answer, replacing one for an equivalent query
+
+        Args:
+            key: tuple - From make_answer_key
+            vector: list - Embedding of the query
+            value: dict - What get returns on a hit
+            versions: dict - From versions(), taken before the answer's chunks were retrieved
+        """
+        vector = self._normalize(vector)
+        with self._lock:
+            if any(self._versions.get(name, 0) != version for name, version in versions.items()):
+                # A namespace changed while the answer was being generated
+                self._counters["stale"] += 1
+                return
+            # Replace the answer to an equivalent query rather than keep both
+            replaced, _ = self._nearest(key, vector)
+            if replaced is not None:
+                self._remove(key, replaced)
+            entry_id = next(self._ids)
+            self._partitions.setdefault(key, _Partition(len(vector))).add(entry_id, vector, {
+                "value": value,
+                "versions": dict(versions),
+                "expires_at": time.monotonic() + self.ttl
+            })
+            self._lru[entry_id] = key
+            self._counters["stores"] += 1
+            while len(self._lru) > self.max_items:
+                oldest, oldest_key = next(iter(self._lru.items()))
+                self._remove(oldest_key, oldest)
+                self._counters["evictions"] += 1
+
+    def invalidate_namespace(self, namespace: str):
+        """
+        Mark every answer built from namespace as stale
+        """
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+            self._counters["invalidations"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["items"] = len(self._lru)
+            stats["partitions"] = len(self._partitions)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+answer_cache = AnswerCache(ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_ITEMS, ANSWER_CACHE_THRESHOLD) if ANSWER_CACHE_ENABLED else None
+
+_invalidation_hooks = []
+
+def register_invalidation_hook(hook: Callable[[str], None]):
+    """
+    Register a function called with the namespace whenever this worker
+    writes to it, e.g. to publish the change to the other workers. The
+    receiving side should call invalidate_local_namespace for each
+    namespace it is told about.
+
+    Args:
+        hook: Callable[[str], None] - Called with the namespace after the write
+    """
+    _invalidation_hooks.append(hook)
+
+def invalidate_local_namespace(namespace: str):
+    """
+    Make this worker's cached answers for a namespace stale
+    """
+    if answer_cache is not None:
+        answer_cache.invalidate_namespace(namespace)
+
+def namespace_changed(namespace: str):
+    """
+    Make the cached answers built from a namespace stale here and, through
+    the registered hooks, in the other workers. Hook failures are logged
+    and ignored; the TTL still bounds how long other workers serve them.
+    """
+    invalidate_local_namespace(namespace)
+    for hook in _invalidation_hooks:
+        try:
+            hook(namespace)
+        except Exception:
+            logger.error(f"Answer cache invalidation hook failed: {traceback.format_exc()}")
@@ -119,6 +119,7 @@ COST_EFFECTIVE_ANALYSIS_USER_PROMPT="""
     
 """
 
+GARBAGE_RESPONSE = "I guess you are typed some gibberish. Please type a valid query."
 
 articles_search_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
 
@@ -3,29 +3,47 @@ import traceback
 from datetime import datetime
 import json 
 import uuid
+import base64
 
 import psycopg2
+import psycopg2.errors
+from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 
 from utils.logger import logger
+from utils.db_pool import get_connection
+from utils.settings_cache import get_cached_settings, cache_settings, invalidate_settings, settings_generation
 
 load_dotenv()
 
 def connect_to_db():
     """
-    Connect to the database and return the connection object
+    Open a dedicated, unpooled connection to the database.
+    Request handlers should use utils.db_pool.get_connection instead; this is
+    kept for one-off scripts that need a connection of their own.
 
     Returns:
         conn: psycopg2.connection
     """ 
     try:
-        print(os.getenv("DB_URL"),type(os.getenv("DB_URL")))
         conn = psycopg2.connect(os.getenv("DB_URL"))
         return conn
     except Exception as e:
         logger.error(f"Error connecting to database: {e}")
         raise e
 
+class DuplicateUserError(Exception):
+    """
+    Raised by create_user when the user id or email is already registered
+
+    Attributes:
+        field: str - "user_id" or "email"
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        super().__init__(f"Duplicate {field}")
+
 def create_user(
     user_id: str,
     first_name: str,
@@ -35,7 +53,9 @@ def create_user(
     last_sign_in_at: datetime
 ):
     """
-    Create a new user in the database
+    Create a new user in the database. Duplicates are caught by the unique
+    indexes on user_id and email, so this is a single INSERT with no
+    separate existence checks.
 
     Args:
         user_id: str
@@ -45,21 +65,87 @@ def create_user(
 
     Returns:
         object: {"message": "User created successfully"}
+
+    Raises:
+        DuplicateUserError: If the user id or email already exists
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO users (user_id, first_name, last_name, email, created_at, last_signed_in_at) VALUES (%s, %s, %s, %s, %s, %s)", 
-                       (user_id, first_name, last_name, email, created_at, last_sign_in_at))
-        conn.commit()
-        logger.info(f"User created successfully: {user_id}")
-        return {"message": "User created successfully"}
+        with get_connection() as conn, conn.cursor() as cursor:
+            try:
+                cursor.execute("INSERT INTO users (user_id, first_name, last_name, email, created_at, last_signed_in_at) VALUES (%s, %s, %s, %s, %s, %s)", 
+                               (user_id, first_name, last_name, email, created_at, last_sign_in_at))
+            except psycopg2.errors.UniqueViolation as e:
+                conn.rollback()
+                constraint = e.diag.constraint_name or ""
+                raise DuplicateUserError("email" if "email" in constraint else "user_id") from e
+            conn.commit()
+            logger.info(f"User created successfully: {user_id}")
+            return {"message": "User created successfully"}
+    except DuplicateUserError as e:
+        logger.info(f"User not created, {e.field} already exists: {user_id}")
+        raise e
     except Exception as e:
         logger.error(f"Error creating user: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
+
+def _values(cursor, template: str, rows: list[tuple]) -> bytes:
+    """
+    Render rows as the body of a multi-row VALUES list
+    """
+    return b",".join(cursor.mogrify(template, row) for row in rows)
+
+def insert_query_history_rows(
+    cursor,
+    user_id: str,
+    query_id: str,
+    query: str,
+    articles_details: list[dict],
+    pie_chart: dict,
+    bar_chart: dict
+):
+    """
+    Write a query, its articles and the per-query article details on the
+    given cursor. The three INSERTs are sent together in one round trip;
+    the caller owns the transaction.
+
+    Args:
+        cursor: psycopg2 cursor
+        user_id: str
+        query_id: str
+        query: str
+        articles_details: list[dict]
+        pie_chart: dict
+        bar_chart: dict
+    """
+    statements = [cursor.mogrify(
+        "INSERT INTO queries (query_id, user_id, query, pie_chart, bar_chart) VALUES (%s, %s, %s, %s, %s)",
+        (query_id, user_id, query, json.dumps(pie_chart), json.dumps(bar_chart))
+    )]
+
+    # The same article can only be upserted once per statement
+    articles = {article['article_id']: article for article in articles_details}
+    if articles:
+        statements.append(b"""
+            INSERT INTO articles (article_id, title, abstract, year) VALUES """ + _values(
+                cursor, "(%s, %s, %s, %s)",
+                [(article_id, article['title'] or '', article['abstract'] or '', None if article['year'] is None else str(article['year']))
+                 # Rows are locked in VALUES order; sorting by id keeps two
+                 # concurrent queries that share articles from deadlocking
+                 for article_id, article in sorted(articles.items())]
+            ) + b"""
+            ON CONFLICT (article_id) DO UPDATE SET
+                title = EXCLUDED.title,
+                abstract = CASE WHEN EXCLUDED.abstract <> '' THEN EXCLUDED.abstract ELSE articles.abstract END,
+                year = COALESCE(EXCLUDED.year, articles.year),
+                updated_at = NOW()""")
+        statements.append(b"""
+            INSERT INTO query_articles (query_id, article_id, position, modality, organ, disease, result) VALUES """ + _values(
+                cursor, "(%s, %s, %s, %s, %s, %s, %s)",
+                [(query_id, article_id, position, article['modality'], article['organ'], article['disease'], article['result'])
+                 for position, (article_id, article) in enumerate(articles.items())]
+            ))
+
+    cursor.execute(b";".join(statements))
 
 def insert_query_history(
     user_id: str,
@@ -71,6 +157,7 @@ def insert_query_history(
 ):
     """
     This API is used to insert the query history into the database.
+    All article rows are written in one round trip and one transaction.
 
     Args:
         user_id: str
@@ -84,114 +171,150 @@ def insert_query_history(
         object: {"message": "Query entered successfully"}
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-
-        for article in articles_details:  
-            cursor.execute("INSERT INTO query_history (query_id, query, user_id, article_id ,article_title, abstract, modality, organ, disease, result, year , pie_chart, bar_chart) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", 
-                           (query_id, query, user_id, article['article_id'], article['title'], article['abstract'], article['modality'], article['organ'], article['disease'], article['result'], article['year'], json.dumps(pie_chart), json.dumps(bar_chart)))
-
-        conn.commit()
-        logger.info(f"Query entered successfully: {query}")
-        return {"message": "Query entered successfully"}
+        with get_connection() as conn, conn.cursor() as cursor:
+            insert_query_history_rows(cursor, user_id, query_id, query, articles_details, pie_chart, bar_chart)
+            conn.commit()
+            logger.info(f"Query entered successfully: {query}")
+            return {"message": "Query entered successfully"}
     except Exception as e :
         logger.error(f"Error entering query: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
+
+def encode_history_cursor(created_at: datetime, query_id: str) -> str:
+    """
+    Opaque keyset cursor pointing just past the given query
+    """
+    payload = json.dumps([created_at.isoformat(), query_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, str]:
+    """
+    Inverse of encode_history_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        created_at, query_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), query_id
+    except Exception as e:
+        raise ValueError(f"Invalid query history cursor: {cursor!r}") from e
 
 def retrieve_query_history(
-    user_id: str
+    user_id: str,
+    cursor: str = None,
+    limit: int = 20,
+    include_abstracts: bool = False
 ):
     """
-    This API is used to retrieve the query history from the database.
+    This API is used to retrieve one page of the query history from the database.
+    Pages are keyset paginated on (created_at, query_id), newest first, so each
+    page costs the same however much history the user has. Charts are not
+    included (see retrieve_descriptive_analysis) and abstracts only on request.
 
     Args:
         user_id: str
+        cursor: str: next_cursor of the previous page, None for the first page
+        limit: int: Number of queries per page
+        include_abstracts: bool: Include each article's abstract
 
     Returns:
-        list[dict]: List of query history
+        tuple: (list[dict] of queries with their articles, next_cursor or None)
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM query_history WHERE user_id = %s", (user_id,))
-        query_history = cursor.fetchall()
-        return query_history
+        after = decode_history_cursor(cursor) if cursor else None
+        with get_connection() as conn, conn.cursor() as db_cursor:
+            db_cursor.execute(f"""
+                WITH page AS (
+                    SELECT query_id, query, created_at
+                    FROM queries
+                    WHERE user_id = %s {"AND (created_at, query_id) < (%s, %s)" if after else ""}
+                    ORDER BY created_at DESC, query_id DESC
+                    LIMIT %s
+                )
+                SELECT page.query_id, page.query, page.created_at, qa.article_id, a.title,
+                       qa.modality, qa.organ, qa.disease, qa.result, a.year,
+                       {"a.abstract" if include_abstracts else "NULL"}
+                FROM page
+                LEFT JOIN query_articles qa ON qa.query_id = page.query_id
+                LEFT JOIN articles a ON a.article_id = qa.article_id
+                ORDER BY page.created_at DESC, page.query_id DESC, qa.position
+            """, (user_id, *(after or ()), limit + 1))
+            rows = db_cursor.fetchall()
+
+        queries = []
+        created_at = {}
+        for row in rows:
+            if not queries or queries[-1]['query_id'] != row[0]:
+                queries.append({'query_id': row[0], 'query': row[1], 'created_at': row[2].isoformat(), 'articles': []})
+                created_at[row[0]] = row[2]
+            if row[3] is not None:
+                article = {
+                    'article_id': row[3], 'article_title': row[4], 'modality': row[5],
+                    'organ': row[6], 'disease': row[7], 'result': row[8], 'year': row[9]
+                }
+                if include_abstracts:
+                    article['abstract'] = row[10]
+                queries[-1]['articles'].append(article)
+
+        # One extra query was read only to tell whether there is a next page
+        next_cursor = None
+        if len(queries) > limit:
+            queries = queries[:limit]
+            last = queries[-1]['query_id']
+            next_cursor = encode_history_cursor(created_at[last], last)
+        return queries, next_cursor
     except Exception as e:  
         logger.error(f"Error retrieving query history: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 def save_articles(user_id: str, article_ids: list[str]):
     """
     Save articles in the database.
-    If the user already exists, append new article_ids while ensuring uniqueness.
+    Articles the user has already saved are left as they are.
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT saved_article_ids FROM saved_articles WHERE user_id = %s", (user_id,))
-        result = cursor.fetchone()
-        
-        if result:
-            # User exists, merge article_ids with existing ones
-            existing_article_ids = set(result[0])  # Convert array to set for uniqueness
-            new_article_ids = set(article_ids)  # Convert input list to set
-            updated_article_ids = list(existing_article_ids | new_article_ids)  # Merge and remove duplicates
-
-            cursor.execute(
-                "UPDATE saved_articles SET saved_article_ids = %s WHERE user_id = %s",
-                (updated_article_ids, user_id)
-            )
-        else:
-            # User does not exist, insert new record
-            cursor.execute(
-                "INSERT INTO saved_articles (user_id, saved_article_ids) VALUES (%s, %s)",
-                (user_id, article_ids)
-            )
-        
-        conn.commit()
-        return {"message": "Articles saved successfully"}
+        with get_connection() as conn, conn.cursor() as cursor:
+            rows = [(user_id, article_id) for article_id in dict.fromkeys(article_ids)]
+            if rows:
+                execute_values(
+                    cursor,
+                    "INSERT INTO user_saved_articles (user_id, article_id) VALUES %s ON CONFLICT (user_id, article_id) DO NOTHING",
+                    rows,
+                    page_size=len(rows)
+                )
+            conn.commit()
+            return {"message": "Articles saved successfully"}
 
     except Exception as e:
-        print(f"Error saving articles: {traceback.format_exc()}")
+        logger.error(f"Error saving articles: {traceback.format_exc()}")
         raise e
 
-    finally:
-        cursor.close()
-        conn.close()
-
 def get_articles_abstract(
     article_ids: list[str]
 ):
     """
-    Get saved articles from the database
+    Get saved articles from the database with a single query
 
     Args:
         article_ids: list[str]
 
     Returns:
-        list[dict]: List of saved articles
+        list[dict]: One entry per requested id, in request order; empty for unknown ids
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        abstract_dict = []
-
-        for article_id in article_ids:
-            article_data = {}
-            cursor.execute("SELECT article_title, abstract FROM query_history WHERE article_id = %s", (article_id,))
-            for article in cursor.fetchall():
-                article_data['article_title'] = article[0]
-                article_data['abstract'] = article[1]
-            abstract_dict.append(article_data)
-
-        return abstract_dict
+        if not article_ids:
+            return []
+        with get_connection() as conn, conn.cursor() as cursor:
+            # articles has one row per article_id, so no DISTINCT ON is needed
+            cursor.execute("""
+                SELECT article_id, title, abstract
+                FROM articles
+                WHERE article_id = ANY(%s)
+            """, (list(article_ids),))
+            found = {row[0]: {'article_title': row[1], 'abstract': row[2]} for row in cursor.fetchall()}
+
+        return [dict(found.get(article_id, {})) for article_id in article_ids]
     except Exception as e:
         logger.error(f"Error getting saved articles: {traceback.format_exc()}")
         raise e
@@ -207,19 +330,15 @@ def get_user_email(user_id: str) -> str:
         str: User's email
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT email FROM users WHERE user_id = %s", (user_id,))
-        email = cursor.fetchone()
-        if email:
-            return email[0]
-        return None
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT email FROM users WHERE user_id = %s", (user_id,))
+            email = cursor.fetchone()
+            if email:
+                return email[0]
+            return None
     except Exception as e:
         logger.error(f"Error getting user email: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 def retrieve_descriptive_analysis(
     query_id: str
@@ -234,20 +353,16 @@ def retrieve_descriptive_analysis(
         tuple: (pie_chart, bar_chart)
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT pie_chart, bar_chart 
-            FROM query_history 
-            WHERE query_id = %s""", (query_id,))
-        pie_chart, bar_chart = cursor.fetchone()
-        return pie_chart, bar_chart
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT pie_chart, bar_chart
+                FROM queries
+                WHERE query_id = %s""", (query_id,))
+            pie_chart, bar_chart = cursor.fetchone()
+            return pie_chart, bar_chart
     except Exception as e:
         logger.error(f"Error retrieving descriptive analysis: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 def update_single_page_urls(user_id: str, url: str):
     """
@@ -258,23 +373,18 @@ def update_single_page_urls(user_id: str, url: str):
         url (str): The URL to be added.
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE users
-            SET single_page_urls = array_append(single_page_urls, %s)
-            WHERE user_id = %s;
-        """, (url, user_id))
-
-        conn.commit()
-        logger.info(f"URL added to single_page_urls for user {user_id}")
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE users
+                SET single_page_urls = array_append(single_page_urls, %s)
+                WHERE user_id = %s;
+            """, (url, user_id))
+
+            conn.commit()
+            logger.info(f"URL added to single_page_urls for user {user_id}")
     except Exception as e:
         logger.error(f"Error updating single_page_urls: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 def update_web_crawl_urls(user_id: str, url: str):
     """
@@ -286,23 +396,18 @@ def update_web_crawl_urls(user_id: str, url: str):
         url (str): The URL to be added.
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE users
-            SET web_crawl_urls = array_append(web_crawl_urls, %s)
-            WHERE user_id = %s;
-        """, (url, user_id))
-
-        conn.commit()
-        logger.info(f"URL added to web_crawl_urls for user {user_id}")
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE users
+                SET web_crawl_urls = array_append(web_crawl_urls, %s)
+                WHERE user_id = %s;
+            """, (url, user_id))
+
+            conn.commit()
+            logger.info(f"URL added to web_crawl_urls for user {user_id}")
     except Exception as e:
         logger.error(f"Error updating web_crawl_urls: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 def create_crawling_job(user_id: str, url: str) -> str:
     """
@@ -316,28 +421,23 @@ def create_crawling_job(user_id: str, url: str) -> str:
         str: The job ID
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        # Generate a unique job ID
-        job_id = f"job_{uuid.uuid4()}"
+        with get_connection() as conn, conn.cursor() as cursor:
+            # Generate a unique job ID
+            job_id = f"job_{uuid.uuid4()}"
         
-        cursor.execute("""
-            INSERT INTO crawling_jobs (job_id, user_id, url, status, created_at)
-            VALUES (%s, %s, %s, 'pending', NOW())
-        """, (job_id, user_id, url))
+            cursor.execute("""
+                INSERT INTO crawling_jobs (job_id, user_id, url, status, created_at)
+                VALUES (%s, %s, %s, 'pending', NOW())
+            """, (job_id, user_id, url))
 
 
         
-        conn.commit()
-        logger.info(f"Created crawling job {job_id} for user {user_id}")
-        return job_id
+            conn.commit()
+            logger.info(f"Created crawling job {job_id} for user {user_id}")
+            return job_id
     except Exception as e:
         logger.error(f"Error creating crawling job: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 def update_job_status(job_id: str, status: str, error_message: str = None):
     """
@@ -349,30 +449,25 @@ def update_job_status(job_id: str, status: str, error_message: str = None):
         error_message (str, optional): Error message if status is 'failed'
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        if error_message:
-            cursor.execute("""
-                UPDATE crawling_jobs
-                SET status = %s, error_message = %s, completed_at = NOW()
-                WHERE job_id = %s
-            """, (status, error_message, job_id))
-        else:
-            cursor.execute("""
-                UPDATE crawling_jobs
-                SET status = %s, completed_at = NOW()
-                WHERE job_id = %s
-            """, (status, job_id))
-        
-        conn.commit()
-        logger.info(f"Updated job {job_id} status to {status}")
+        with get_connection() as conn, conn.cursor() as cursor:
+            if error_message:
+                cursor.execute("""
+                    UPDATE crawling_jobs
+                    SET status = %s, error_message = %s, completed_at = NOW()
+                    WHERE job_id = %s
+                """, (status, error_message, job_id))
+            else:
+                cursor.execute("""
+                    UPDATE crawling_jobs
+                    SET status = %s, completed_at = NOW()
+                    WHERE job_id = %s
+                """, (status, job_id))
+        
+            conn.commit()
+            logger.info(f"Updated job {job_id} status to {status}")
     except Exception as e:
         logger.error(f"Error updating job status: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 def get_job_status(job_id: str, user_id: str) -> dict:
     """
@@ -386,32 +481,27 @@ def get_job_status(job_id: str, user_id: str) -> dict:
         dict: Job details including status
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT job_id, url, status, created_at, completed_at, error_message
-            FROM crawling_jobs
-            WHERE job_id = %s AND user_id = %s
-        """, (job_id, user_id))
-        
-        job = cursor.fetchone()
-        if job:
-            return {
-                "job_id": job[0],
-                "url": job[1],
-                "status": job[2],
-                "created_at": job[3],
-                "completed_at": job[4],
-                "error_message": job[5]
-            }
-        return None
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT job_id, url, status, created_at, completed_at, error_message
+                FROM crawling_jobs
+                WHERE job_id = %s AND user_id = %s
+            """, (job_id, user_id))
+        
+            job = cursor.fetchone()
+            if job:
+                return {
+                    "job_id": job[0],
+                    "url": job[1],
+                    "status": job[2],
+                    "created_at": job[3],
+                    "completed_at": job[4],
+                    "error_message": job[5]
+                }
+            return None
     except Exception as e:
         logger.error(f"Error getting job status: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 def get_single_page_urls(user_id: str) -> list[str]:
     """
@@ -424,23 +514,18 @@ def get_single_page_urls(user_id: str) -> list[str]:
         list[str]: List of single page URLs
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT single_page_urls
-            FROM users
-            WHERE user_id = %s
-        """, (user_id,))
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT single_page_urls
+                FROM users
+                WHERE user_id = %s
+            """, (user_id,))
         
-        result = cursor.fetchone()
-        return result[0] if result and result[0] else []
+            result = cursor.fetchone()
+            return result[0] if result and result[0] else []
     except Exception as e:
         logger.error(f"Error getting single page URLs: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 def get_web_crawl_urls(user_id: str) -> list[str]:
     """
@@ -453,81 +538,18 @@ def get_web_crawl_urls(user_id: str) -> list[str]:
         list[str]: List of web crawl URLs
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT web_crawl_urls
-            FROM users
-            WHERE user_id = %s
-        """, (user_id,))
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT web_crawl_urls
+                FROM users
+                WHERE user_id = %s
+            """, (user_id,))
         
-        result = cursor.fetchone()
-        return result[0] if result and result[0] else []
+            result = cursor.fetchone()
+            return result[0] if result and result[0] else []
     except Exception as e:
         logger.error(f"Error getting web crawl URLs: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
-
-def check_user_exists(user_id: str) -> bool:
-    """
-    Check if a user already exists in the database
-    
-    Args:
-        user_id (str): The user ID to check
-        
-    Returns:
-        bool: True if user exists, False otherwise
-    """
-    try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM users
-            WHERE user_id = %s
-        """, (user_id,))
-        
-        count = cursor.fetchone()[0]
-        return count > 0
-    except Exception as e:
-        logger.error(f"Error checking user existence: {traceback.format_exc()}")
-        raise e
-    finally:
-        cursor.close()
-        conn.close()
-
-def check_email_exists(email: str) -> bool:
-    """
-    Check if an email is already registered in the database
-    
-    Args:
-        email (str): The email to check
-        
-    Returns:
-        bool: True if email exists, False otherwise
-    """
-    try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM users
-            WHERE email = %s
-        """, (email,))
-        
-        count = cursor.fetchone()[0]
-        return count > 0
-    except Exception as e:
-        logger.error(f"Error checking email existence: {traceback.format_exc()}")
-        raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 def update_user_documents(user_id: str, document_names: list[str]):
     """
@@ -538,24 +560,19 @@ def update_user_documents(user_id: str, document_names: list[str]):
         document_names (list[str]): List of document names to add
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        # Convert list to array and append to existing documents
-        cursor.execute("""
-            UPDATE users
-            SET documents = array_cat(documents, %s)
-            WHERE user_id = %s;
-        """, (document_names, user_id))
-
-        conn.commit()
-        logger.info(f"Documents added for user {user_id}")
+        with get_connection() as conn, conn.cursor() as cursor:
+            # Convert list to array and append to existing documents
+            cursor.execute("""
+                UPDATE users
+                SET documents = array_cat(documents, %s)
+                WHERE user_id = %s;
+            """, (document_names, user_id))
+
+            conn.commit()
+            logger.info(f"Documents added for user {user_id}")
     except Exception as e:
         logger.error(f"Error updating user documents: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 def get_user_documents(user_id: str) -> list[str]:
     """
@@ -568,23 +585,18 @@ def get_user_documents(user_id: str) -> list[str]:
         list[str]: List of document names
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT documents
-            FROM users
-            WHERE user_id = %s
-        """, (user_id,))
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT documents
+                FROM users
+                WHERE user_id = %s
+            """, (user_id,))
         
-        result = cursor.fetchone()
-        return result[0] if result and result[0] else []
+            result = cursor.fetchone()
+            return result[0] if result and result[0] else []
     except Exception as e:
         logger.error(f"Error getting user documents: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 def save_chatbot_settings(
     user_id: str,
@@ -607,51 +619,38 @@ def save_chatbot_settings(
         dict: Success message
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        # Check if settings exist for user
-        cursor.execute("""
-            SELECT setting_id 
-            FROM chatbot_settings 
-            WHERE user_id = %s
-        """, (user_id,))
-        
-        existing = cursor.fetchone()
-        
-        if existing:
-            # Update existing settings
-            cursor.execute("""
-                UPDATE chatbot_settings
-                SET tonality = %s,
-                    language = %s,
-                    use_knowledge_base = %s,
-                    tokens = %s,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE user_id = %s
-            """, (tonality, language, use_knowledge_base, tokens, user_id))
-        else:
-            # Insert new settings
+        with get_connection() as conn, conn.cursor() as cursor:
             cursor.execute("""
-                INSERT INTO chatbot_settings 
+                INSERT INTO chatbot_settings
                 (user_id, tonality, language, use_knowledge_base, tokens)
                 VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (user_id) DO UPDATE
+                SET tonality = EXCLUDED.tonality,
+                    language = EXCLUDED.language,
+                    use_knowledge_base = EXCLUDED.use_knowledge_base,
+                    tokens = EXCLUDED.tokens,
+                    updated_at = CURRENT_TIMESTAMP
             """, (user_id, tonality, language, use_knowledge_base, tokens))
-            
-        conn.commit()
+            conn.commit()
+
+        invalidate_settings(user_id)
+        cache_settings(user_id, {
+            "tonality": tonality,
+            "language": language,
+            "use_knowledge_base": use_knowledge_base,
+            "tokens": tokens
+        })
         logger.info(f"Chatbot settings saved for user {user_id}")
         return {"message": "Settings saved successfully"}
     except Exception as e:
         logger.error(f"Error saving chatbot settings: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 
 def get_chatbot_settings(user_id: str) -> dict:
     """
-    Get chatbot settings for a user
+    Get chatbot settings for a user, from the in-process settings cache
+    when possible
     
     Args:
         user_id (str): The user ID
@@ -660,71 +659,249 @@ def get_chatbot_settings(user_id: str) -> dict:
         dict: Chatbot settings
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT tonality, language, use_knowledge_base, tokens
-            FROM chatbot_settings
-            WHERE user_id = %s
-        """, (user_id,))
-
-        settings = cursor.fetchone()    
-        return {
-            "tonality": settings[0],
-            "language": settings[1],
-            "use_knowledge_base": settings[2],
-            "tokens": settings[3]
-        }
+        settings = get_cached_settings(user_id)
+        if settings is not None:
+            return settings
+
+        # A save that lands during the read bumps the generation, so the
+        # row read before it is not cached over the new settings
+        generation = settings_generation()
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT tonality, language, use_knowledge_base, tokens
+                FROM chatbot_settings
+                WHERE user_id = %s
+            """, (user_id,))
+
+            row = cursor.fetchone()    
+            settings = {
+                "tonality": row[0],
+                "language": row[1],
+                "use_knowledge_base": row[2],
+                "tokens": row[3]
+            }
+        cache_settings(user_id, settings, generation)
+        return settings
     except Exception as e:
         logger.error(f"Error getting chatbot settings: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 def get_saved_articles_ids(user_id: str) -> list[str]:
     """
     Get saved articles for a user
     """
     try:
-        conn = connect_to_db()  
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT saved_article_ids
-            FROM saved_articles
-            WHERE user_id = %s
-        """, (user_id,))
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT article_id
+                FROM user_saved_articles
+                WHERE user_id = %s
+                ORDER BY saved_at
+            """, (user_id,))
 
-        result = cursor.fetchone()
-        return result[0] if result and result[0] else []
+            return [row[0] for row in cursor.fetchall()]
     except Exception as e:  
         logger.error(f"Error in saved articles: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
-def get_articles_from_query_history(article_ids: list[str]) -> list[dict]:
+def get_feed_user_ids() -> list[str]:
     """
-    Get articles from query history
+    Users with at least one saved article, i.e. the users that get a
+    publication feed
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT DISTINCT user_id
+                FROM user_saved_articles
+            """)
+            return [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Error in get feed user ids: {traceback.format_exc()}")
+        raise e
+
+def get_feed_seeds(user_id: str) -> list[tuple]:
+    """
+    The user's saved articles with their titles and when each was last
+    searched for related publications
+
+    Args:
+        user_id: str
+
+    Returns:
+        list[tuple]: (article_id, title, last_searched_at or None)
+    """
+    try:
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT a.article_id, a.title, s.last_searched_at
+                FROM user_saved_articles usa
+                JOIN articles a ON a.article_id = usa.article_id
+                LEFT JOIN publication_feed_seeds s
+                    ON s.user_id = usa.user_id AND s.source_article_id = a.article_id
+                WHERE usa.user_id = %s
+            """, (user_id,))
+            return cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Error in get feed seeds: {traceback.format_exc()}")
+        raise e
 
-        # Ensure article_ids is a tuple for the IN clause
-        query = """
-            SELECT * FROM query_history WHERE article_id = ANY(%s)
-        """
-        cursor.execute(query, (article_ids,))  # Pass as a single-element tuple
+def save_feed_refresh(
+    user_id: str,
+    publications: list[dict],
+    searched_article_ids: list[str],
+    searched_at: datetime
+):
+    """
+    Store the result of one feed refresh in a single transaction: add the
+    new publications and move the searched seeds' watermark forward
 
-        result = cursor.fetchall()
-        return result
+    Args:
+        user_id: str
+        publications: list[dict]: article_id, title, abstract, source_article_id
+        searched_article_ids: list[str]: Seeds whose search completed
+        searched_at: datetime: When the searches started
+    """
+    try:
+        with get_connection() as conn, conn.cursor() as cursor:
+            if publications:
+                execute_values(cursor, """
+                    INSERT INTO publication_feed (user_id, article_id, title, abstract, source_article_id, found_at)
+                    VALUES %s
+                    ON CONFLICT (user_id, article_id) DO NOTHING
+                """, [
+                    (user_id, publication['article_id'], publication['title'], publication['abstract'] or '', publication.get('source_article_id'), searched_at)
+                    for publication in publications
+                ])
+            if searched_article_ids:
+                execute_values(cursor, """
+                    INSERT INTO publication_feed_seeds (user_id, source_article_id, last_searched_at)
+                    VALUES %s
+                    ON CONFLICT (user_id, source_article_id) DO UPDATE SET last_searched_at = EXCLUDED.last_searched_at
+                """, [(user_id, article_id, searched_at) for article_id in searched_article_ids])
+            conn.commit()
+    except Exception as e:
+        logger.error(f"Error in save feed refresh: {traceback.format_exc()}")
+        raise e
+
+def get_publication_feed(user_id: str, limit: int = 50) -> list[dict]:
+    """
+    The user's stored publication feed, newest first. Publications found
+    through articles the user has since unsaved, or that the user has
+    saved themselves, are left out.
+
+    Args:
+        user_id: str
+        limit: int
+
+    Returns:
+        list[dict]: article_id, title, abstract, source_article_id
+    """
+    try:
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT pf.article_id, pf.title, pf.abstract, pf.source_article_id
+                FROM publication_feed pf
+                WHERE pf.user_id = %s
+                  AND EXISTS (
+                      SELECT 1 FROM user_saved_articles usa
+                      WHERE usa.user_id = pf.user_id AND usa.article_id = pf.source_article_id
+                  )
+                  AND NOT EXISTS (
+                      SELECT 1 FROM user_saved_articles usa
+                      WHERE usa.user_id = pf.user_id AND usa.article_id = pf.article_id
+                  )
+                ORDER BY pf.found_at DESC
+                LIMIT %s
+            """, (user_id, limit))
+            return [
+                {'article_id': row[0], 'title': row[1], 'abstract': row[2], 'source_article_id': row[3]}
+                for row in cursor.fetchall()
+            ]
+    except Exception as e:
+        logger.error(f"Error in get publication feed: {traceback.format_exc()}")
+        raise e
+
+def get_namespace_copy_checkpoint(source_namespace: str, target_namespace: str) -> dict:
+    """
+    Where a previous copy between two namespaces got to
+
+    Args:
+        source_namespace: str
+        target_namespace: str
+
+    Returns:
+        dict: pagination_token, vectors_copied and completed, or None if never started
+    """
+    try:
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT pagination_token, vectors_copied, completed_at IS NOT NULL
+                FROM namespace_copy_checkpoints
+                WHERE source_namespace = %s AND target_namespace = %s
+            """, (source_namespace, target_namespace))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return {"pagination_token": row[0], "vectors_copied": row[1], "completed": row[2]}
+    except Exception as e:
+        logger.error(f"Error getting namespace copy checkpoint: {traceback.format_exc()}")
+        raise e
+
+def save_namespace_copy_checkpoint(
+    source_namespace: str,
+    target_namespace: str,
+    pagination_token: str,
+    vectors_copied: int,
+    completed: bool = False
+):
+    """
+    Record that every page before pagination_token has been copied
+
+    Args:
+        source_namespace: str
+        target_namespace: str
+        pagination_token: str: Token of the first page not yet copied, None when done
+        vectors_copied: int
+        completed: bool
+    """
+    try:
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO namespace_copy_checkpoints
+                (source_namespace, target_namespace, pagination_token, vectors_copied, completed_at)
+                VALUES (%s, %s, %s, %s, CASE WHEN %s THEN NOW() END)
+                ON CONFLICT (source_namespace, target_namespace) DO UPDATE
+                SET pagination_token = EXCLUDED.pagination_token,
+                    vectors_copied = EXCLUDED.vectors_copied,
+                    completed_at = EXCLUDED.completed_at,
+                    updated_at = NOW()
+            """, (source_namespace, target_namespace, pagination_token, vectors_copied, completed))
+            conn.commit()
+    except Exception as e:
+        logger.error(f"Error saving namespace copy checkpoint: {traceback.format_exc()}")
+        raise e
+
+def get_incomplete_namespace_copies(stale_after: float) -> list[tuple[str, str]]:
+    """
+    Namespace copies that started but never completed and have not
+    checkpointed recently, i.e. whose process died or gave up
+
+    Args:
+        stale_after: float - Seconds without a checkpoint after which a copy counts as abandoned
+
+    Returns:
+        list[tuple[str, str]]: (source_namespace, target_namespace) pairs, oldest first
+    """
+    try:
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT source_namespace, target_namespace
+                FROM namespace_copy_checkpoints
+                WHERE completed_at IS NULL AND updated_at < NOW() - make_interval(secs => %s)
+                ORDER BY updated_at
+            """, (stale_after,))
+            return [(row[0], row[1]) for row in cursor.fetchall()]
     except Exception as e:
-        logger.error(f"Error in get articles from query history: {traceback.format_exc()}")
+        logger.error(f"Error getting incomplete namespace copies: {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
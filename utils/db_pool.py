@@ -0,0 +1,184 @@
+import os
+import time
+import asyncio
+import functools
+import weakref
+import threading
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+from dotenv import load_dotenv
+
+from utils.logger import logger
+
+load_dotenv()
+
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# psycopg2's pool closes a returned connection once it holds this many idle
+# ones, so anything below the max size means reconnecting under load
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", str(DB_POOL_MAX_SIZE)))
+# Seconds to wait for a free connection before giving up
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Connections older than this (seconds) are closed and replaced on checkout
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+# Connections idle for longer than this (seconds) are pinged before being handed out
+DB_POOL_HEALTHCHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTHCHECK_INTERVAL", "30"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(DB_POOL_MAX_SIZE)
+# conn -> (created_at, last_used_at), both time.monotonic(). Weak keys, so an
+# entry goes away with its connection however the pool drops it.
+_conn_times = weakref.WeakKeyDictionary()
+_conn_times_lock = threading.Lock()
+
+# Blocking DB calls from async handlers are run here, sized to the pool so that
+# queued work waits for a worker thread instead of for a connection.
+_db_executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX_SIZE, thread_name_prefix="db")
+
+def get_pool() -> ThreadedConnectionPool:
+    """
+    Return the process wide connection pool, creating it on first use
+
+    Returns:
+        ThreadedConnectionPool - The shared pool
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_MIN_SIZE,
+                    DB_POOL_MAX_SIZE,
+                    os.getenv("DB_URL")
+                )
+                logger.info(f"Database pool created (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE})")
+    return _pool
+
+def _discard(pool: ThreadedConnectionPool, conn):
+    """
+    Close a connection and drop it from the pool
+    """
+    with _conn_times_lock:
+        _conn_times.pop(conn, None)
+    pool.putconn(conn, close=True)
+
+def _is_healthy(conn) -> bool:
+    """
+    Run a trivial query to make sure the server side of the connection is alive
+    """
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _checkout():
+    """
+    Take a connection from the pool, recycling expired or broken ones
+
+    Returns:
+        conn: psycopg2.connection
+    """
+    if not _slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise TimeoutError(f"Timed out after {DB_POOL_TIMEOUT}s waiting for a database connection")
+
+    try:
+        pool = get_pool()
+        while True:
+            conn = pool.getconn()
+            now = time.monotonic()
+            with _conn_times_lock:
+                created_at, last_used_at = _conn_times.setdefault(conn, (now, now))
+
+            if conn.closed:
+                _discard(pool, conn)
+                continue
+
+            if now - created_at > DB_POOL_MAX_LIFETIME:
+                logger.info("Recycling database connection that exceeded its max lifetime")
+                _discard(pool, conn)
+                continue
+
+            if now - last_used_at > DB_POOL_HEALTHCHECK_INTERVAL and not _is_healthy(conn):
+                logger.warning("Discarding database connection that failed its health check")
+                _discard(pool, conn)
+                continue
+
+            return conn
+    except Exception:
+        _slots.release()
+        raise
+
+def _release(conn):
+    """
+    Return a connection to the pool, rolling back anything left uncommitted
+    """
+    pool = get_pool()
+    try:
+        if conn.closed:
+            _discard(pool, conn)
+            return
+
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+
+        with _conn_times_lock:
+            created_at, _ = _conn_times.get(conn, (time.monotonic(), None))
+            _conn_times[conn] = (created_at, time.monotonic())
+        pool.putconn(conn)
+    except psycopg2.Error:
+        logger.error(f"Error returning connection to pool: {traceback.format_exc()}")
+        _discard(pool, conn)
+    finally:
+        _slots.release()
+
+@contextmanager
+def get_connection():
+    """
+    Check out a pooled connection for the duration of a with-block
+
+    Uncommitted work is rolled back when the block exits, so callers must
+    commit explicitly, exactly as with a plain psycopg2 connection.
+
+    Yields:
+        conn: psycopg2.connection
+    """
+    conn = _checkout()
+    try:
+        yield conn
+    finally:
+        _release(conn)
+
+async def run_db(func, *args, **kwargs):
+    """
+    Run a blocking database function without blocking the event loop
+
+    Args:
+        func: callable - Function from utils.db_operations (or any blocking DB call)
+        *args, **kwargs - Arguments forwarded to func
+
+    Returns:
+        any - Whatever func returns
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+
+def close_pool():
+    """
+    Close every connection held by the pool
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            with _conn_times_lock:
+                _conn_times.clear()
+            _pool = None
+            logger.info("Database pool closed")
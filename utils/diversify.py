@@ -0,0 +1,139 @@
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Run the diversification stage in retrieve_chunks
+DIVERSIFY_ENABLED = os.getenv("DIVERSIFY_ENABLED", "false").lower() == "true"
+# Candidates fetched per final chunk when diversifying
+DIVERSIFY_FETCH_MULTIPLIER = int(os.getenv("DIVERSIFY_FETCH_MULTIPLIER", "4"))
+# 1.0 ranks purely by relevance, 0.0 purely by novelty
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Candidates at least this cosine-similar to a better ranked one are dropped
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.95"))
+
+def normalize_rows(vectors) -> np.ndarray:
+    """
+    Rows scaled to unit length, so dot products are cosine similarities
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def remove_near_duplicates(
+    vectors: np.ndarray,
+    threshold: float = NEAR_DUPLICATE_THRESHOLD
+) -> list[int]:
+    """
+    Greedily keep candidates in rank order, skipping any whose cosine
+    similarity to an already kept one reaches threshold
+
+    Args:
+        vectors: np.ndarray - Unit length rows, best ranked first
+        threshold: float
+
+    Returns:
+        list[int] - Indices of the kept rows, in rank order
+    """
+    if len(vectors) == 0:
+        return []
+    similarity = vectors @ vectors.T
+    # Only compare each row with the rows ranked above it
+    duplicate = np.triu(similarity >= threshold, k=1)
+    kept = []
+    dropped = np.zeros(len(vectors), dtype=bool)
+    for i in range(len(vectors)):
+        if dropped[i]:
+            continue
+        kept.append(i)
+        dropped |= duplicate[i]
+    return kept
+
+def maximal_marginal_relevance(
+    relevance: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = MMR_LAMBDA
+) -> list[int]:
+    """
+    Pick k candidates that are relevant but not redundant with each other:
+    each step takes the candidate maximizing
+    lambda * relevance - (1 - lambda) * max similarity to those already picked
+
+    Args:
+        relevance: np.ndarray - Relevance of each candidate to the query
+        vectors: np.ndarray - Unit length candidate rows
+        k: int
+        lambda_mult: float
+
+    Returns:
+        list[int] - Indices of the picked candidates, in pick order
+    """
+    n = len(vectors)
+    if n == 0 or k <= 0:
+        return []
+    similarity = vectors @ vectors.T
+    picked = [int(np.argmax(relevance))]
+    # Highest similarity of every candidate to anything picked so far
+    redundancy = similarity[picked[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[picked[0]] = False
+    while len(picked) < min(k, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return picked
+
+def diversify_matches(
+    query_vector: list,
+    matches: list[dict],
+    k: int,
+    lambda_mult: float = MMR_LAMBDA,
+    threshold: float = NEAR_DUPLICATE_THRESHOLD,
+    relevance: list[float] = None
+) -> list[dict]:
+    """
+    Drop exact and near-duplicate candidates, then choose k of the rest
+    with maximal marginal relevance
+
+    Args:
+        query_vector: list - Query embedding
+        matches: list[dict] - Candidates best first, each with values and metadata["text"]
+        k: int - Number of matches to return
+        lambda_mult: float - MMR trade-off
+        threshold: float - Near-duplicate cosine similarity
+        relevance: list[float] - Relevance per candidate; cosine similarity to the query when None
+
+    Returns:
+        list[dict] - Up to k matches, most relevant first
+    """
+    if not matches:
+        return []
+
+    # Identical texts first, which needs no vectors at all
+    seen = set()
+    unique = []
+    for position, match in enumerate(matches):
+        text = " ".join(match["metadata"].get("text", "").split()).lower()
+        if text not in seen:
+            seen.add(text)
+            unique.append(position)
+
+    vectors = normalize_rows([matches[position]["values"] for position in unique])
+    kept = remove_near_duplicates(vectors, threshold)
+    vectors = vectors[kept]
+    positions = [unique[i] for i in kept]
+
+    if relevance is None:
+        scores = vectors @ normalize_rows(query_vector)
+    else:
+        scores = np.asarray([relevance[position] for position in positions], dtype=np.float32)
+
+    picked = maximal_marginal_relevance(scores, vectors, k, lambda_mult)
+    picked.sort(key=lambda i: -scores[i])
+    return [matches[positions[i]] for i in picked]
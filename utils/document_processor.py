@@ -12,7 +12,7 @@ from fastapi import UploadFile
 
 from utils.logger import logger
 from utils.data_upload_utils import get_chunks
-from utils.openai_funcs import get_embeddings
+from utils.openai_funcs import get_embeddings_batch
 from utils.pinecone_funcs import upsert_chunks
 
 def extract_text_from_pdf(file_path: str) -> str:
@@ -90,9 +90,9 @@ def process_document(file_path: str, file_name: str) -> Tuple[str, List[dict]]:
             
         # Generate chunks and embeddings
         chunks = get_chunks(text)
+        embeddings = get_embeddings_batch(chunks)
         vectors = []
-        for chunk in chunks:
-            vector = get_embeddings(chunk)
+        for chunk, vector in zip(chunks, embeddings):
             vectors.append({
                 "id": str(uuid.uuid4()),
                 "values": vector,
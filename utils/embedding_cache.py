@@ -0,0 +1,273 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import traceback
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from utils.logger import logger
+
+load_dotenv()
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache", "embeddings.sqlite3")
+)
+# Bytes of float32 vectors kept in process memory (a 3072 dimension vector is 12 KB)
+EMBEDDING_CACHE_MEMORY_BYTES = int(os.getenv("EMBEDDING_CACHE_MEMORY_BYTES", str(128 * 1024 ** 2)))
+# Upper bound on the size of the vectors stored on disk
+EMBEDDING_CACHE_DISK_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_BYTES", str(2 * 1024 ** 3)))
+
+def make_cache_key(
+    model: str,
+    dimensions: Optional[int],
+    text: str
+) -> str:
+    """
+    Build the content address of an embedding
+
+    Args:
+        model: str - Embedding model name
+        dimensions: Optional[int] - Requested output dimensions, None for the model default
+        text: str - Text that was embedded
+
+    Returns:
+        str - Cache key
+    """
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model}:{dimensions or 'default'}:{digest}"
+
+class EmbeddingCache:
+    """
+    Two tier embedding cache: an in-process LRU in front of a size bounded
+    SQLite file that is shared by every worker on the host.
+    Vectors are stored in both tiers as packed float32, and the total size
+    on disk is kept up to date by triggers so writes never scan the table.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        memory_bytes: int,
+        disk_max_bytes: int
+    ):
+        self.path = path
+        self.memory_bytes = memory_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        # _lock guards the memory tier and counters, _db_lock the SQLite
+        # connection, so memory hits never wait on disk I/O
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0
+        }
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access_idx ON embeddings (last_access)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute("""
+                INSERT OR IGNORE INTO embeddings_meta (name, value)
+                SELECT 'bytes', COALESCE(SUM(size), 0) FROM embeddings
+                UNION ALL SELECT 'items', COUNT(*) FROM embeddings
+            """)
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS embeddings_size_insert AFTER INSERT ON embeddings BEGIN
+                    UPDATE embeddings_meta SET value = value + NEW.size WHERE name = 'bytes';
+                    UPDATE embeddings_meta SET value = value + 1 WHERE name = 'items';
+                END
+            """)
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS embeddings_size_update AFTER UPDATE OF size ON embeddings BEGIN
+                    UPDATE embeddings_meta SET value = value + NEW.size - OLD.size WHERE name = 'bytes';
+                END
+            """)
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS embeddings_size_delete AFTER DELETE ON embeddings BEGIN
+                    UPDATE embeddings_meta SET value = value - OLD.size WHERE name = 'bytes';
+                    UPDATE embeddings_meta SET value = value - 1 WHERE name = 'items';
+                END
+            """)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _remember(self, key: str, blob: bytes):
+        # Called with _lock held
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+        self._memory[key] = blob
+        self._memory_size += len(blob)
+        while self._memory_size > self.memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def get_many(self, keys: list[str]) -> dict:
+        """
+        Look up several keys at once
+
+        Args:
+            keys: list[str] - Cache keys
+
+        Returns:
+            dict - key -> vector for every key that was found
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                blob = self._memory.get(key)
+                if blob is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = blob
+                    self._counters["memory_hits"] += 1
+                else:
+                    missing.append(key)
+
+        if missing:
+            unique_missing = list(dict.fromkeys(missing))
+            rows = []
+            with self._db_lock:
+                # Stay well below SQLite's bound-parameter limit
+                for start in range(0, len(unique_missing), 500):
+                    key_batch = unique_missing[start:start + 500]
+                    placeholders = ",".join("?" * len(key_batch))
+                    rows.extend(self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        key_batch
+                    ).fetchall())
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(time.time(), key) for key, _ in rows]
+                    )
+
+            with self._lock:
+                for key, blob in rows:
+                    found[key] = blob
+                    self._remember(key, blob)
+                for key in missing:
+                    if key in found:
+                        self._counters["disk_hits"] += 1
+                    else:
+                        self._counters["misses"] += 1
+
+        return {key: array("f", blob).tolist() for key, blob in found.items()}
+
+    def set_many(self, items: dict):
+        """
+        Store several vectors at once, evicting the least recently used
+        entries from disk if the size bound is exceeded
+
+        Args:
+            items: dict - key -> vector
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = array("f", vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+
+        with self._lock:
+            for key, blob, _, _ in rows:
+                self._remember(key, blob)
+            self._counters["writes"] += len(rows)
+
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    """
+                    INSERT INTO embeddings (key, vector, size, last_access) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        vector = excluded.vector, size = excluded.size, last_access = excluded.last_access
+                    """,
+                    rows
+                )
+                evicted = self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if evicted:
+            with self._lock:
+                self._counters["evictions"] += evicted
+
+    def _evict(self) -> int:
+        # Called with _db_lock held, inside the write transaction
+        total = self._conn.execute("SELECT value FROM embeddings_meta WHERE name = 'bytes'").fetchone()[0]
+        if total <= self.disk_max_bytes:
+            return 0
+
+        # Drop the oldest entries until we are 10% below the bound so that
+        # eviction does not run again on the very next write
+        target = int(self.disk_max_bytes * 0.9)
+        to_delete = []
+        for key, size in self._conn.execute("SELECT key, size FROM embeddings ORDER BY last_access"):
+            if total <= target:
+                break
+            to_delete.append((key,))
+            total -= size
+
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", to_delete)
+        logger.info(f"Evicted {len(to_delete)} embeddings from the disk cache")
+        return len(to_delete)
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters for the cache
+
+        Returns:
+            dict - Counters plus the overall hit rate and current sizes
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_items"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_size
+        with self._db_lock:
+            meta = dict(self._conn.execute("SELECT name, value FROM embeddings_meta").fetchall())
+        stats["disk_items"] = meta.get("items", 0)
+        stats["disk_bytes"] = meta.get("bytes", 0)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+embedding_cache = None
+if EMBEDDING_CACHE_ENABLED:
+    try:
+        embedding_cache = EmbeddingCache(
+            EMBEDDING_CACHE_PATH,
+            EMBEDDING_CACHE_MEMORY_BYTES,
+            EMBEDDING_CACHE_DISK_MAX_BYTES
+        )
+    except Exception:
+        logger.error(f"Embedding cache disabled, could not open {EMBEDDING_CACHE_PATH}: {traceback.format_exc()}")
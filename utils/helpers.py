@@ -1,82 +1,217 @@
+import asyncio
 import traceback
-import xml.etree.ElementTree as ET
 from typing import Optional
 
-import requests
-
 from utils.logger import logger
 
-from utils.constants import articles_search_url,articles_fetch_url
-from utils.db_operations import connect_to_db
+from utils.pubmed_client import pubmed_client
+from utils.pubmed_store import pubmed_store
+from utils.db_pool import get_connection
+
+async def search_pmids(
+    query : str,
+    retmax : int = 10,
+    mindate : Optional[str] = None
+):
+    """
+    PMIDs matching a PubMed query, served from the esearch cache when fresh.
+    Searches with a mindate are incremental feed refreshes that must see
+    articles indexed since the last run, so they always go to PubMed.
+
+    Args:
+    query : str : PubMed search term
+    retmax : int : Maximum number of PMIDs
+    mindate : Optional[str] : Only PMIDs added on or after this date (YYYY/MM/DD)
+
+    Returns:
+    pmids : list[str] : Matching PMIDs, most relevant first
+    """
+    if mindate is not None:
+        return await pubmed_client.esearch(query, retmax=retmax, mindate=mindate)
+
+    if pubmed_store is not None:
+        pmids = await asyncio.to_thread(pubmed_store.get_search, query, retmax)
+        if pmids is not None:
+            return pmids
+
+    pmids = await pubmed_client.esearch(query, retmax=retmax)
+    if pubmed_store is not None:
+        await asyncio.to_thread(pubmed_store.put_search, query, retmax, pmids)
+    return pmids
+
+async def iter_articles_by_pmid(
+    pmids : list[str]
+):
+    """
+    Yield parsed articles for the given PMIDs: first the ones already in the
+    local article store, then the rest as they stream in from PubMed
+
+    Args:
+    pmids : list[str] : PMIDs to load
+
+    Yields:
+    article : dict : Parsed article
+    """
+    # The SQLite store is blocking, so it runs in a thread off the event loop
+    stored = await asyncio.to_thread(pubmed_store.get_articles, pmids) if pubmed_store is not None else {}
+    for article in stored.values():
+        yield article
+
+    missing = [pmid for pmid in dict.fromkeys(pmids) if pmid not in stored]
+    if not missing:
+        return
+
+    pending = []
+    fetched = 0
+    try:
+        async for article in pubmed_client.iter_articles(missing):
+            fetched += 1
+            pending.append(article)
+            if pubmed_store is not None and len(pending) >= 20:
+                await asyncio.to_thread(pubmed_store.put_articles, pending)
+                pending = []
+            yield article
+    finally:
+        if pubmed_store is not None and pending:
+            await asyncio.to_thread(pubmed_store.put_articles, pending)
+        logger.info(f"Fetched {fetched} articles from PubMed, {len(stored)} served locally")
+
+async def get_articles_by_pmid(
+    pmids : list[str]
+):
+    """
+    Parsed articles for the given PMIDs, fetching from PubMed only the ones
+    missing from the local article store
+
+    Args:
+    pmids : list[str] : PMIDs to load
 
-def retreive_articles(
+    Returns:
+    articles : dict : pmid -> parsed article
+    """
+    return {article["pmid"]: article async for article in iter_articles_by_pmid(pmids)}
+
+async def retreive_articles(
     query : str,
-    article_id_for_duplicacy_check : Optional[str] = None
+    article_id_for_duplicacy_check : Optional[str] = None,
+    mindate : Optional[str] = None
 ):
     """
     Retrieve articles from PubMed based on the query provided
     
     Args:
     query : str : Query to search for articles
+    article_id_for_duplicacy_check : Optional[str] : Article to leave out of the results
+    mindate : Optional[str] : Only articles added to PubMed on or after this date (YYYY/MM/DD)
     
     Returns:
     articles_context : str : Context of the articles retrieved
     """
     try:
-        search_params = {
-            "db": "pubmed",
-            "term": query,
-            "retmax": "10",  
-            "retmode": "xml"
-        }
-        search_response = requests.get(articles_search_url, params=search_params)
-        
-        search_root = ET.fromstring(search_response.content)
-
-        uids = [uid.text for uid in search_root.findall(".//Id")]
-
-        fetch_params = {
-            "db": "pubmed",
-            "id": ",".join(uids),
-            "retmode": "xml"
-        }
-        fetch_response = requests.get(articles_fetch_url, params=fetch_params)
-        fetch_root = ET.fromstring(fetch_response.content)
-        
-        articles_context = ""
-        articles = []
-        for article in fetch_root.findall(".//PubmedArticle"):
-            article_dict = {}
-            article_id = article.find(".//ArticleId").text
+        uids = await search_pmids(query, retmax=10, mindate=mindate)
+        rank = {uid: position for position, uid in enumerate(uids)}
 
+        # Articles arrive as they are parsed; keep each one's context block
+        # and join them once, in search rank order, at the end
+        entries = []
+        async for article in iter_articles_by_pmid(uids):
+            article_id = article["pmid"]
             if article_id_for_duplicacy_check is not None and article_id == article_id_for_duplicacy_check:
                 continue
-            
-            articles_context += "Article ID : " + article_id + "\n"
-            article_dict['article_id'] = article_id
-            title = article.find(".//ArticleTitle").text
-            articles_context += "Article Title : " + title + "\n"
-            article_dict['title'] = title
-            logger.info(f"Title : {title}") 
 
-            abstract = article.findall(".//AbstractText")
-            article_dict['abstract'] = ""
-            if abstract is not None :
-                articles_context += "Abstract : "
-                for text in abstract:
-                    if text.text is not None:
-                        articles_context += text.text 
-                        article_dict['abstract'] += text.text
+            title = article["title"]
+            logger.info(f"Title : {title}") 
+            parts = ["Article ID : ", article_id, "\n", "Article Title : ", title, "\n"]
+            if article["abstract"]:
+                parts += ["Abstract : ", article["abstract"]]
             else:
                 logger.info("Abstract not found")
-            
-            articles_context += "\n\n"
-            articles.append(article_dict)
+            parts.append("\n\n")
+
+            entries.append((
+                rank.get(article_id, len(uids)),
+                "".join(parts),
+                {'article_id': article_id, 'title': title, 'abstract': article["abstract"]}
+            ))
+
+        entries.sort(key=lambda entry: entry[0])
+        articles_context = "".join(entry[1] for entry in entries)
+        articles = [entry[2] for entry in entries]
         return articles_context , articles
     except Exception as e :
         logger.error(f"Error in retrieving articles : {traceback.format_exc()}")
         raise e
     
+async def find_related_publications(
+    seed_articles : list[tuple[str, str]],
+    concurrency : int = 5,
+    budget : Optional[float] = None,
+    mindates : Optional[dict] = None,
+    completed_seeds : Optional[set] = None
+):
+    """
+    Search PubMed for articles related to each seed article concurrently and
+    merge the results
+
+    Args:
+    seed_articles : list[tuple[str, str]] : (article_id, title) pairs, searched by title
+    concurrency : int : Maximum number of searches in flight
+    budget : Optional[float] : Seconds to wait before returning whatever has finished
+    mindates : Optional[dict] : article_id -> YYYY/MM/DD; only search for PMIDs added since then
+    completed_seeds : Optional[set] : Receives the article_id of every seed whose search finished
+
+    Returns:
+    publications : list[dict] : Related articles, deduplicated and excluding the seeds
+    is_complete : bool : False if some searches were cut off by the budget
+    """
+    seeds = {}
+    for article_id, title in seed_articles:
+        if article_id not in seeds and title:
+            seeds[article_id] = title
+    seen_titles = set()
+    unique_seeds = []
+    for article_id, title in seeds.items():
+        if title.strip().lower() not in seen_titles:
+            seen_titles.add(title.strip().lower())
+            unique_seeds.append((article_id, title))
+
+    if not unique_seeds:
+        return [], True
+
+    semaphore = asyncio.Semaphore(concurrency)
+    mindates = mindates or {}
+
+    async def search(article_id, title):
+        async with semaphore:
+            _, publications = await retreive_articles(title, article_id, mindate=mindates.get(article_id))
+            for publication in publications:
+                publication["source_article_id"] = article_id
+            return publications
+
+    tasks = [asyncio.create_task(search(article_id, title)) for article_id, title in unique_seeds]
+    done, pending = await asyncio.wait(tasks, timeout=budget)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(f"Related publication search budget exhausted, {len(pending)} of {len(tasks)} searches cut off")
+
+    publications = []
+    seen_ids = set(seeds)
+    for (article_id, _), task in zip(unique_seeds, tasks):
+        if task not in done:
+            continue
+        if task.exception() is not None:
+            logger.error(f"Related publication search failed: {task.exception()!r}")
+            continue
+        if completed_seeds is not None:
+            completed_seeds.add(article_id)
+        for publication in task.result():
+            if publication["article_id"] not in seen_ids:
+                seen_ids.add(publication["article_id"])
+                publications.append(publication)
+
+    return publications, not pending
+
 def retreive_modality_count(
     query_id : str
 ):
@@ -87,28 +222,35 @@ def retreive_modality_count(
         query_id : str : Query ID
 
     Returns:
-        modality_count : list[dict] : Modality count
+        modality_count : list[list] : [modality, count] pairs, most common first
+        articles_details : list[dict] : article_id and article_title of each article
     """
     try:
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM query_history WHERE query_id = %s", (query_id,))
-        bubble_graph_details = cursor.fetchall()
+        # Both parts are computed in the database and come back as one row
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT
+                    (
+                        SELECT json_agg(json_build_array(modality, count) ORDER BY count DESC, modality)
+                        FROM (
+                            SELECT modality, COUNT(*) AS count
+                            FROM query_articles
+                            WHERE query_id = %(query_id)s
+                            GROUP BY modality
+                        ) AS modalities
+                    ),
+                    (
+                        SELECT json_agg(json_build_object('article_id', qa.article_id, 'article_title', a.title) ORDER BY qa.position)
+                        FROM query_articles qa
+                        JOIN articles a ON a.article_id = qa.article_id
+                        WHERE qa.query_id = %(query_id)s
+                    )
+            """, {"query_id": query_id})
+            modality_count, articles_details = cursor.fetchone()
 
-        modality_count = {}
-        articles_details = []
-        for detail in bubble_graph_details:
-            modality_count[detail[1]] = modality_count.get(detail[1], 0) + 1
-            articles_details.append({'article_id': detail[7], 'article_title': detail[8]})
-
-        modality_count = sorted(modality_count.items(), key=lambda x: x[1], reverse=True)
-
-        return modality_count , articles_details
+        return modality_count or [], articles_details or []
     except Exception as e:
         logger.error(f"Error in retrieving bubble graph details : {traceback.format_exc()}")
         raise e
-    finally:
-        cursor.close()
-        conn.close()
 
 
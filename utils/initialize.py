@@ -2,19 +2,25 @@ import os
 
 from dotenv import load_dotenv
 from pinecone import Pinecone
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from llama_index.core.node_parser import (
     SemanticSplitterNodeParser,
 )
 from llama_index.embeddings.openai import OpenAIEmbedding
 
+from utils.vector_store import VECTOR_STORE_BACKEND
+
 load_dotenv()
 
 os.environ['OPENAI_API_KEY'] = os.getenv("OPENAI_API_KEY")  
-os.environ['PINECONE_API_KEY'] = os.getenv("PINECONE_API_KEY")
 
-pc = Pinecone()
-index = pc.Index(host=os.getenv("PINECONE_INDEX_HOST"))
+# Only the Pinecone vector store backend needs a Pinecone client
+pc = None
+index = None
+if VECTOR_STORE_BACKEND == "pinecone":
+    os.environ['PINECONE_API_KEY'] = os.getenv("PINECONE_API_KEY")
+    pc = Pinecone()
+    index = pc.Index(host=os.getenv("PINECONE_INDEX_HOST"))
 embed_model = OpenAIEmbedding()
 splitter = SemanticSplitterNodeParser(
     include_metadata=True,
@@ -22,4 +28,5 @@ splitter = SemanticSplitterNodeParser(
     breakpoint_percentile_threshold=95, 
     embed_model=embed_model
 )
-openai_client = OpenAI()
\ No newline at end of file
+openai_client = OpenAI()
+async_openai_client = AsyncOpenAI()
@@ -0,0 +1,114 @@
+import os
+import re
+import traceback
+
+from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+
+from utils.logger import logger
+from utils.db_pool import get_connection
+
+load_dotenv()
+
+# Chunks are only worth indexing when something reads the index, so the
+# default follows RETRIEVAL_MODE (utils/pinecone_funcs.py). Enable it ahead
+# of switching to hybrid, or backfill with ingestion/build_keyword_index.py.
+KEYWORD_INDEX_ENABLED = os.getenv(
+    "KEYWORD_INDEX_ENABLED",
+    str(os.getenv("RETRIEVAL_MODE", "dense").lower() == "hybrid")
+).lower() == "true"
+
+# Words, plus hyphenated terms such as EGFR-TKI or IL-6, which are matched
+# as a phrase. These, gene symbols and PMIDs are what dense retrieval misses.
+_TERM_PATTERN = re.compile(r"\w[\w\-]*")
+
+def _terms(query: str) -> list[str]:
+    """
+    Distinct search terms of free text, in order
+    """
+    terms = dict.fromkeys(term.strip("-").lower() for term in _TERM_PATTERN.findall(query))
+    return [term for term in terms if term]
+
+class KeywordIndex:
+    """
+    Per-namespace full-text index over chunk text in the shared Postgres
+    (chunk_keywords, migration 0007), so hybrid retrieval can fuse exact
+    term matches with semantic ones and every worker sees the same index
+    """
+
+    def add(self, namespace: str, chunks: list[tuple[str, str]]):
+        """
+        Index chunk texts, replacing any earlier text stored under the same id
+
+        Args:
+            namespace: str
+            chunks: list[tuple[str, str]] - (chunk id, text) pairs
+        """
+        # One row per id, in id order so concurrent writers lock rows in the same order
+        chunks = sorted({chunk_id: text for chunk_id, text in chunks if text}.items())
+        if not chunks:
+            return
+        with get_connection() as conn, conn.cursor() as cursor:
+            execute_values(cursor, """
+                INSERT INTO chunk_keywords (namespace, chunk_id, text) VALUES %s
+                ON CONFLICT (namespace, chunk_id) DO UPDATE SET text = EXCLUDED.text
+            """, [(namespace, chunk_id, text) for chunk_id, text in chunks])
+            conn.commit()
+
+    def search(self, namespace: str, query: str, top_k: int) -> list[dict]:
+        """
+        Full-text search of one namespace, matching any of the query's terms
+
+        Args:
+            namespace: str
+            query: str - Free text
+            top_k: int
+
+        Returns:
+            list[dict] - id, score (higher is better) and text, best first
+        """
+        terms = _terms(query)
+        if not terms:
+            return []
+        # Each term becomes its own phrase query, so user input cannot use
+        # tsquery syntax and hyphenated terms keep their word order
+        tsquery = " || ".join(["phraseto_tsquery('english', %s)"] * len(terms))
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT chunk_id, text, ts_rank_cd(tsv, q) AS rank
+                FROM chunk_keywords, (SELECT {tsquery} AS q) AS terms
+                WHERE namespace = %s AND tsv @@ q
+                ORDER BY rank DESC
+                LIMIT %s
+            """, (*terms, namespace, top_k))
+            rows = cursor.fetchall()
+        return [{"id": chunk_id, "score": float(rank), "text": text} for chunk_id, text, rank in rows]
+
+    def count(self, namespace: str) -> int:
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM chunk_keywords WHERE namespace = %s", (namespace,))
+            return cursor.fetchone()[0]
+
+keyword_index = KeywordIndex() if KEYWORD_INDEX_ENABLED else None
+
+def index_chunks(
+    namespace: str,
+    vectors: list[dict]
+):
+    """
+    Add the text of upserted vectors to the namespace's keyword index.
+    Failures are logged and ignored: dense retrieval still works without it.
+
+    Args:
+        namespace: str
+        vectors: list[dict] - Vectors as upserted, with the chunk text in metadata["text"]
+    """
+    if keyword_index is None:
+        return
+    try:
+        keyword_index.add(namespace, [
+            (vector["id"], (vector.get("metadata") or {}).get("text", ""))
+            for vector in vectors
+        ])
+    except Exception:
+        logger.error(f"Error updating keyword index for {namespace}: {traceback.format_exc()}")
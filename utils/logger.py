@@ -59,4 +59,29 @@ def log_performance(func):
 
         return result
 
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+async def log_stream_performance(stream, name: str):
+    """
+    Pass an async generator through, logging like log_performance once it
+    is exhausted, so streamed responses are timed to their last piece
+    rather than to when the response object was created
+
+    Args:
+        stream : async generator : The body of a StreamingResponse
+        name : str : Name used in the log lines
+    Yields:
+        The items of stream
+    """
+    start_time = time.time()
+    process = psutil.Process()
+    start_memory = process.memory_info().rss / (1024 ** 2)  # Memory in MB
+    try:
+        async for item in stream:
+            yield item
+    finally:
+        execution_time = time.time() - start_time
+        memory_used = process.memory_info().rss / (1024 ** 2) - start_memory
+
+        logger.info(f"Function '{name}' executed in {execution_time:.4f} seconds")
+        logger.info(f"Memory used: {memory_used:.4f} MB")
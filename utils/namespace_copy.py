@@ -0,0 +1,292 @@
+import os
+import time
+import asyncio
+import queue
+import threading
+import traceback
+
+from dotenv import load_dotenv
+
+from utils.logger import logger
+from utils.vector_store import get_vector_store
+from utils.keyword_index import index_chunks
+from utils.answer_cache import namespace_changed
+from utils.db_operations import (
+    connect_to_db, get_namespace_copy_checkpoint, save_namespace_copy_checkpoint, get_incomplete_namespace_copies
+)
+
+load_dotenv()
+
+# Vector ids listed, fetched and upserted per page
+NAMESPACE_COPY_PAGE_SIZE = int(os.getenv("NAMESPACE_COPY_PAGE_SIZE", "100"))
+NAMESPACE_COPY_FETCH_WORKERS = int(os.getenv("NAMESPACE_COPY_FETCH_WORKERS", "4"))
+NAMESPACE_COPY_UPSERT_WORKERS = int(os.getenv("NAMESPACE_COPY_UPSERT_WORKERS", "4"))
+# Pages allowed to wait in each queue; with the page size this bounds how
+# many vectors are held in memory at once
+NAMESPACE_COPY_QUEUE_SIZE = int(os.getenv("NAMESPACE_COPY_QUEUE_SIZE", "8"))
+# Seconds between checkpoint writes and progress log lines
+NAMESPACE_COPY_CHECKPOINT_INTERVAL = float(os.getenv("NAMESPACE_COPY_CHECKPOINT_INTERVAL", "5"))
+# Resume copies left incomplete by a crashed or failed run in the background
+NAMESPACE_COPY_RESUME_ENABLED = os.getenv("NAMESPACE_COPY_RESUME_ENABLED", "true").lower() == "true"
+# Seconds between two sweeps for incomplete copies
+NAMESPACE_COPY_RESUME_INTERVAL = float(os.getenv("NAMESPACE_COPY_RESUME_INTERVAL", "600"))
+# Seconds without a checkpoint before a copy counts as abandoned rather
+# than still running somewhere; well above the checkpoint interval
+NAMESPACE_COPY_STALE_AFTER = float(os.getenv("NAMESPACE_COPY_STALE_AFTER", "300"))
+# Arbitrary key for the Postgres advisory lock that makes only one worker
+# process resume copies at a time
+NAMESPACE_COPY_RESUME_LOCK_KEY = 7263002
+
+_DONE = object()
+
+class NamespaceCopy:
+    """
+    Copy every vector of one vector store namespace into another as a pipeline:
+    the calling thread pages through the source ids, fetch workers load each
+    page and upsert workers write it, connected by bounded queues so memory
+    stays flat however large the namespace is.
+
+    Pages finish out of order, so progress is checkpointed as the pagination
+    token after the last page for which it and every earlier page have been
+    written. A copy that dies resumes from there; pages after it may be
+    written twice, which upsert makes harmless.
+    """
+
+    def __init__(
+        self,
+        source_namespace: str,
+        target_namespace: str,
+        page_size: int = NAMESPACE_COPY_PAGE_SIZE,
+        fetch_workers: int = NAMESPACE_COPY_FETCH_WORKERS,
+        upsert_workers: int = NAMESPACE_COPY_UPSERT_WORKERS,
+        queue_size: int = NAMESPACE_COPY_QUEUE_SIZE
+    ):
+        self.source_namespace = source_namespace
+        self.target_namespace = target_namespace
+        self.page_size = page_size
+        self.fetch_workers = fetch_workers
+        self.upsert_workers = upsert_workers
+        self.vector_store = get_vector_store()
+        self._fetch_queue = queue.Queue(maxsize=queue_size)
+        self._upsert_queue = queue.Queue(maxsize=queue_size)
+        self._results = queue.Queue()
+        self._stop = threading.Event()
+        self._error = None
+        self._started_at = None
+
+        # Checkpoint state, only touched by the calling thread
+        self._finished_pages = {}
+        self._next_page = 0
+        self._token = None
+        self._copied = 0
+        self._copied_this_run = 0
+        self._last_checkpoint_at = time.monotonic()
+
+    def _fetch_worker(self):
+        while True:
+            item = self._fetch_queue.get()
+            if item is _DONE:
+                return
+            if self._stop.is_set():
+                continue
+            seq, ids, next_token = item
+            try:
+                vectors = list(self.vector_store.fetch(self.source_namespace, ids).values())
+                self._put(self._upsert_queue, (seq, vectors, next_token))
+            except Exception as e:
+                self._fail(seq, e)
+
+    def _upsert_worker(self):
+        while True:
+            item = self._upsert_queue.get()
+            if item is _DONE:
+                return
+            if self._stop.is_set():
+                continue
+            seq, vectors, next_token = item
+            try:
+                if vectors:
+                    self.vector_store.upsert(self.target_namespace, vectors)
+                    index_chunks(self.target_namespace, vectors)
+                    namespace_changed(self.target_namespace)
+                self._results.put((seq, len(vectors), next_token))
+            except Exception as e:
+                self._fail(seq, e)
+
+    def _fail(self, seq: int, error: Exception):
+        logger.error(f"Namespace copy {self.source_namespace} -> {self.target_namespace} failed on page {seq}: {error!r}")
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _put(self, target_queue: queue.Queue, item, collect: bool = False) -> bool:
+        """
+        Put with a timeout loop so producers notice a failure elsewhere
+        instead of blocking forever on a full queue. The lister passes
+        collect=True to keep checkpointing while it waits.
+        """
+        while not self._stop.is_set():
+            try:
+                target_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                if collect:
+                    self._collect_results()
+        return False
+
+    def _collect_results(self, force_checkpoint: bool = False):
+        """
+        Move the checkpoint forward over every contiguous finished page
+        """
+        while True:
+            try:
+                seq, count, next_token = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._finished_pages[seq] = (count, next_token)
+            self._copied_this_run += count
+
+        while self._next_page in self._finished_pages:
+            count, self._token = self._finished_pages.pop(self._next_page)
+            self._copied += count
+            self._next_page += 1
+
+        now = time.monotonic()
+        if force_checkpoint or now - self._last_checkpoint_at >= NAMESPACE_COPY_CHECKPOINT_INTERVAL:
+            self._last_checkpoint_at = now
+            save_namespace_copy_checkpoint(self.source_namespace, self.target_namespace, self._token, self._copied)
+            elapsed = now - self._started_at
+            logger.info(
+                f"Namespace copy {self.source_namespace} -> {self.target_namespace}: {self._copied_this_run} vectors "
+                f"in {elapsed:.1f}s ({self._copied_this_run / elapsed if elapsed else 0:.0f} vectors/s)"
+            )
+
+    def run(self, resume: bool = True) -> dict:
+        """
+        Copy the namespace, resuming from the last checkpoint when there is one
+
+        Args:
+            resume: bool - Continue a previous copy instead of starting over
+
+        Returns:
+            dict - vectors copied by this run and in total, seconds taken and vectors/s
+        """
+        self._started_at = time.monotonic()
+        checkpoint = get_namespace_copy_checkpoint(self.source_namespace, self.target_namespace) if resume else None
+        if checkpoint is not None:
+            if checkpoint["completed"]:
+                logger.info(f"Namespace copy {self.source_namespace} -> {self.target_namespace} already completed")
+                return {"copied": 0, "total": checkpoint["vectors_copied"], "seconds": 0.0, "vectors_per_second": 0.0}
+            self._token = checkpoint["pagination_token"]
+            self._copied = checkpoint["vectors_copied"]
+            logger.info(f"Resuming namespace copy {self.source_namespace} -> {self.target_namespace} after {self._copied} vectors")
+
+        fetch_threads = [threading.Thread(target=self._fetch_worker, daemon=True) for _ in range(self.fetch_workers)]
+        upsert_threads = [threading.Thread(target=self._upsert_worker, daemon=True) for _ in range(self.upsert_workers)]
+        for thread in fetch_threads + upsert_threads:
+            thread.start()
+
+        try:
+            seq = 0
+            token = self._token
+            while not self._stop.is_set():
+                ids, token = self.vector_store.list_ids(self.source_namespace, limit=self.page_size, pagination_token=token)
+                if ids:
+                    if not self._put(self._fetch_queue, (seq, ids, token), collect=True):
+                        break
+                    seq += 1
+                self._collect_results()
+                if not token:
+                    break
+        except Exception as e:
+            self._fail(seq, e)
+        finally:
+            for _ in fetch_threads:
+                self._fetch_queue.put(_DONE)
+            for thread in fetch_threads:
+                thread.join()
+            for _ in upsert_threads:
+                self._upsert_queue.put(_DONE)
+            for thread in upsert_threads:
+                thread.join()
+
+        self._collect_results(force_checkpoint=True)
+        if self._error is not None:
+            raise self._error
+
+        save_namespace_copy_checkpoint(self.source_namespace, self.target_namespace, None, self._copied, completed=True)
+        elapsed = time.monotonic() - self._started_at
+        stats = {
+            "copied": self._copied_this_run,
+            "total": self._copied,
+            "seconds": round(elapsed, 3),
+            "vectors_per_second": round(self._copied_this_run / elapsed, 1) if elapsed else 0.0
+        }
+        logger.info(f"Namespace copy {self.source_namespace} -> {self.target_namespace} finished: {stats}")
+        return stats
+
+def copy_namespace(
+    source_namespace: str,
+    target_namespace: str,
+    resume: bool = True,
+    **options
+) -> dict:
+    """
+    Stream every vector of source_namespace into target_namespace, see NamespaceCopy
+
+    Args:
+        source_namespace: str
+        target_namespace: str
+        resume: bool - Continue a previous copy instead of starting over
+        options - page_size, fetch_workers, upsert_workers, queue_size
+
+    Returns:
+        dict - Copy statistics
+    """
+    try:
+        return NamespaceCopy(source_namespace, target_namespace, **options).run(resume=resume)
+    except Exception as e:
+        logger.error(f"Error copying namespace {source_namespace} -> {target_namespace}: {traceback.format_exc()}")
+        raise e
+
+def _try_lock(conn) -> bool:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (NAMESPACE_COPY_RESUME_LOCK_KEY,))
+        return cursor.fetchone()[0]
+
+async def resume_incomplete_copies():
+    """
+    Resume every abandoned namespace copy from its checkpoint, one at a time
+    """
+    copies = await asyncio.to_thread(get_incomplete_namespace_copies, NAMESPACE_COPY_STALE_AFTER)
+    if copies:
+        logger.info(f"Resuming {len(copies)} incomplete namespace copies")
+    for source_namespace, target_namespace in copies:
+        try:
+            await asyncio.to_thread(copy_namespace, source_namespace, target_namespace)
+        except Exception:
+            # Already logged; the next sweep tries again
+            continue
+
+async def run_namespace_copy_resumer():
+    """
+    Background loop started with the application: a sweep at startup, then
+    every NAMESPACE_COPY_RESUME_INTERVAL. Every worker process runs it, but a
+    Postgres advisory lock lets only one of them resume copies per sweep.
+    """
+    while True:
+        conn = None
+        try:
+            conn = await asyncio.to_thread(connect_to_db)
+            conn.autocommit = True
+            if await asyncio.to_thread(_try_lock, conn):
+                await resume_incomplete_copies()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.error(f"Error in namespace copy resumer: {traceback.format_exc()}")
+        finally:
+            if conn is not None:
+                # Closing the session releases the advisory lock
+                conn.close()
+        await asyncio.sleep(NAMESPACE_COPY_RESUME_INTERVAL)
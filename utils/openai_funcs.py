@@ -1,31 +1,193 @@
+import os
 import traceback
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+
+import tiktoken
 
 from utils.logger import logger
-from utils.initialize import openai_client
+from utils.initialize import openai_client, async_openai_client
+from utils.embedding_cache import embedding_cache, make_cache_key
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+# OpenAI limits: 8191 tokens per input, 2048 inputs and 300k tokens per request
+EMBEDDING_MAX_INPUT_TOKENS = 8191
+EMBEDDING_MAX_BATCH_ITEMS = int(os.getenv("EMBEDDING_MAX_BATCH_ITEMS", "2048"))
+EMBEDDING_MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "300000"))
+EMBEDDING_BATCH_CONCURRENCY = int(os.getenv("EMBEDDING_BATCH_CONCURRENCY", "4"))
+
+_encoding = tiktoken.encoding_for_model(EMBEDDING_MODEL)
+
+def _embedding_kwargs(
+    dimensions : Optional[int]
+):
+    kwargs = {"model": EMBEDDING_MODEL}
+    if dimensions is not None:
+        kwargs["dimensions"] = dimensions
+    return kwargs
+
+def _cache_get(
+    keys : list[str]
+):
+    """
+    Look keys up in the embedding cache, treating cache failures as misses
+    """
+    if embedding_cache is None:
+        return {}
+    try:
+        return embedding_cache.get_many(keys)
+    except Exception:
+        logger.error(f"Error reading embedding cache: {traceback.format_exc()}")
+        return {}
+
+def _cache_set(
+    items : dict
+):
+    """
+    Store vectors in the embedding cache, ignoring cache failures
+    """
+    if embedding_cache is None:
+        return
+    try:
+        embedding_cache.set_many(items)
+    except Exception:
+        logger.error(f"Error writing embedding cache: {traceback.format_exc()}")
 
 def get_embeddings(
-    text : str
+    text : str,
+    dimensions : Optional[int] = None
 ):
     """
     This function gets the embeddings of the text
     
     Args:
         text : str : The text for which embeddings are to be generated
+        dimensions : Optional[int] : Output dimensions, None for the model default
         
     Returns:
         embeddings : list : The embeddings of the text as a list
     """
     try:
+        key = make_cache_key(EMBEDDING_MODEL, dimensions, text)
+        cached = _cache_get([key])
+        if key in cached:
+            return cached[key]
+
         response = openai_client.embeddings.create(
-            model="text-embedding-3-large",
-            input=text
+            input=text,
+            **_embedding_kwargs(dimensions)
         )
-        return response.data[0].embedding
+        embedding = response.data[0].embedding
+        _cache_set({key: embedding})
+        return embedding
     except Exception as e:
         logger.error(f"Error in get_embeddings: {traceback.format_exc()}")
         return {"error": f"Internal Server Error {e}"}
 
+def _pack_batches(
+    texts : list[str]
+):
+    """
+    Group texts into request sized batches, truncating any single text that
+    exceeds the per-input token limit
+
+    Args:
+        texts : list[str] : The texts to be embedded
+
+    Returns:
+        batches : list[list[str]] : Consecutive batches covering texts in order
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for text in texts:
+        tokens = _encoding.encode(text)
+        if len(tokens) > EMBEDDING_MAX_INPUT_TOKENS:
+            tokens = tokens[:EMBEDDING_MAX_INPUT_TOKENS]
+            text = _encoding.decode(tokens)
+
+        if batch and (len(batch) >= EMBEDDING_MAX_BATCH_ITEMS or batch_tokens + len(tokens) > EMBEDDING_MAX_BATCH_TOKENS):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+
+        batch.append(text)
+        batch_tokens += len(tokens)
+
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _embed_batch(
+    batch : list[str],
+    dimensions : Optional[int] = None
+):
+    """
+    Embed one batch of texts in a single request
+
+    Args:
+        batch : list[str] : The texts to be embedded
+        dimensions : Optional[int] : Output dimensions, None for the model default
+
+    Returns:
+        embeddings : list[list] : The embeddings in the same order as batch
+    """
+    response = openai_client.embeddings.create(
+        input=batch,
+        **_embedding_kwargs(dimensions)
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def get_embeddings_batch(
+    texts : list[str],
+    dimensions : Optional[int] = None
+):
+    """
+    This function gets the embeddings of many texts using as few requests as
+    the API limits allow, running up to EMBEDDING_BATCH_CONCURRENCY requests
+    at a time. Texts already in the embedding cache are not sent.
+
+    Args:
+        texts : list[str] : The texts for which embeddings are to be generated
+        dimensions : Optional[int] : Output dimensions, None for the model default
+
+    Returns:
+        embeddings : list[list] : One embedding per text, in the order of texts
+    """
+    try:
+        if not texts:
+            return []
+
+        keys = [make_cache_key(EMBEDDING_MODEL, dimensions, text) for text in texts]
+        vectors = _cache_get(keys)
+
+        # Each distinct uncached text is embedded once, however often it repeats
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in pending:
+                pending[key] = text
+
+        if pending:
+            batches = _pack_batches(list(pending.values()))
+            logger.info(f"Embedding {len(pending)} of {len(texts)} texts in {len(batches)} requests")
+
+            embeddings = []
+            if len(batches) == 1:
+                embeddings = _embed_batch(batches[0], dimensions)
+            else:
+                with ThreadPoolExecutor(max_workers=min(EMBEDDING_BATCH_CONCURRENCY, len(batches))) as executor:
+                    for batch_embeddings in executor.map(lambda batch: _embed_batch(batch, dimensions), batches):
+                        embeddings.extend(batch_embeddings)
+
+            computed = dict(zip(pending.keys(), embeddings))
+            _cache_set(computed)
+            vectors.update(computed)
+
+        return [vectors[key] for key in keys]
+    except Exception as e:
+        logger.error(f"Error in get_embeddings_batch: {traceback.format_exc()}")
+        raise e
+
 def get_openai_response(
     messages : list ,
     is_json : bool = False,
@@ -43,4 +205,64 @@ def get_openai_response(
         return response.choices[0].message.content
     except Exception as e:
         logger.error(f"Error in get_openai_response: {traceback.format_exc()}")
-        return {"error": f"Internal Server Error {e}"}
\ No newline at end of file
+        return {"error": f"Internal Server Error {e}"}
+
+async def get_openai_response_async(
+    messages : list ,
+    is_json : bool = False,
+    max_tokens : Optional[int] = None
+):
+    """
+    Async counterpart of get_openai_response, for use inside request handlers
+
+    Args:
+        messages : list : Chat messages
+        is_json : bool : Ask the model for a JSON object
+        max_tokens : Optional[int] : Completion token limit
+
+    Returns:
+        content : str : The completion text
+    """
+    try:
+        response = await async_openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=max_tokens,
+            response_format={ "type": "json_object" } if is_json else None
+            )
+
+        return response.choices[0].message.content
+    except Exception as e:
+        logger.error(f"Error in get_openai_response_async: {traceback.format_exc()}")
+        return {"error": f"Internal Server Error {e}"}
+
+async def stream_openai_response(
+    messages : list ,
+    max_tokens : Optional[int] = None
+):
+    """
+    Stream a completion as it is generated
+
+    Args:
+        messages : list : Chat messages
+        max_tokens : Optional[int] : Completion token limit
+
+    Yields:
+        content : str : Successive pieces of the completion text
+    """
+    try:
+        stream = await async_openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=max_tokens,
+            stream=True
+            )
+
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        logger.error(f"Error in stream_openai_response: {traceback.format_exc()}")
+        raise e
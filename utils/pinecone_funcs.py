@@ -1,44 +1,201 @@
+import os
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
 
 from utils.openai_funcs import get_embeddings
 from utils.logger import logger
-from utils.initialize import index 
+from utils.vector_store import get_vector_store
+from utils.keyword_index import keyword_index, index_chunks
+from utils.namespace_copy import copy_namespace
+from utils.answer_cache import namespace_changed
+from utils.diversify import DIVERSIFY_ENABLED, DIVERSIFY_FETCH_MULTIPLIER, diversify_matches
+
+load_dotenv()
+
+# Namespace holding the corpus every user can search
+SHARED_NAMESPACE = os.getenv("SHARED_NAMESPACE", "chatbot")
+# Search the shared namespace alongside the user's own at query time
+SHARED_CORPUS_RETRIEVAL_ENABLED = os.getenv("SHARED_CORPUS_RETRIEVAL_ENABLED", "true").lower() == "true"
+# Copy the shared corpus into each new user's namespace at signup. Not needed
+# when shared retrieval is enabled; kept for indexes that rely on it.
+COPY_SHARED_CORPUS_ON_SIGNUP = os.getenv("COPY_SHARED_CORPUS_ON_SIGNUP", "false").lower() == "true"
+# "dense" for vector search only, "hybrid" to fuse it with Postgres full-text
+# search. Backfill the keyword index (ingestion/build_keyword_index.py)
+# before switching existing namespaces to hybrid.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense").lower()
+# Candidates taken from each ranking before fusion, as a multiple of num_results
+HYBRID_CANDIDATE_MULTIPLIER = int(os.getenv("HYBRID_CANDIDATE_MULTIPLIER", "4"))
+# Reciprocal rank fusion constant; larger values flatten the rank weighting
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+_query_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="vector_query")
+
+def reciprocal_rank_fusion(
+    rankings: list[list[dict]],
+    k: int = RRF_K
+):
+    """
+    Fuse ranked match lists by reciprocal rank: each id scores the sum of
+    1 / (k + rank) over the lists it appears in
+
+    Args:
+        rankings: list[list[dict]] - Match lists, best first, each match with an id
+        k: int - Fusion constant
+
+    Returns:
+        list[dict] - Matches with the fused score, best first; the first
+        occurrence of each id supplies the rest of its fields
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, match in enumerate(ranking, start=1):
+            if match['id'] not in fused:
+                fused[match['id']] = dict(match, score=0.0)
+            fused[match['id']]['score'] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda match: match['score'], reverse=True)
+
+def _dedupe_by_score(
+    matches: list[dict]
+):
+    # Users created before shared retrieval hold a copy of the shared
+    # corpus under the same ids, so keep each id once
+    best = {}
+    for match in matches:
+        if match['id'] not in best or match['score'] > best[match['id']]['score']:
+            best[match['id']] = match
+    return sorted(best.values(), key=lambda match: match['score'], reverse=True)
+
+def _merge_by_rank(
+    rankings: list[list[dict]]
+):
+    # Full-text ranks depend on each namespace's own documents and cannot
+    # be compared across namespaces, so interleave the rankings by position
+    # and keep the first occurrence of each id
+    merged = {}
+    positioned = sorted(
+        ((rank, order, match) for order, ranking in enumerate(rankings) for rank, match in enumerate(ranking)),
+        key=lambda item: (item[0], item[1])
+    )
+    for _, _, match in positioned:
+        merged.setdefault(match['id'], match)
+    return list(merged.values())
+
+def _keyword_search(
+    namespace: str,
+    query: str,
+    top_k: int
+):
+    # Dense retrieval still answers if the keyword index is unavailable
+    try:
+        return keyword_index.search(namespace, query, top_k)
+    except Exception:
+        logger.error(f"Keyword search failed for {namespace}: {traceback.format_exc()}")
+        return []
+
+def _attach_values(
+    vector_store,
+    matches: list[dict]
+):
+    # Keyword-only hits come without embeddings; fetch them from the
+    # namespace each was found in
+    missing = {}
+    for match in matches:
+        if 'values' not in match:
+            missing.setdefault(match['namespace'], []).append(match)
+    for name, namespace_matches in missing.items():
+        fetched = vector_store.fetch(name, [match['id'] for match in namespace_matches])
+        for match in namespace_matches:
+            if match['id'] in fetched:
+                match['values'] = fetched[match['id']]['values']
 
 def retrieve_chunks(
     namespace: str,
     query: str,
-    num_results: int = 5
+    num_results: int = 5,
+    include_shared: bool = SHARED_CORPUS_RETRIEVAL_ENABLED,
+    mode: str = RETRIEVAL_MODE,
+    diversify: bool = DIVERSIFY_ENABLED
 ):
     """
-    Retrieve chunks from Pinecone
+    Retrieve chunks from the vector store. With include_shared, the user's namespace
+    and the shared namespace are queried in parallel and the matches merged
+    by score, so users see the shared corpus without a copy of it. In
+    hybrid mode the dense ranking is fused with a full-text keyword ranking over
+    the same namespaces, which catches exact terms such as drug names, gene
+    symbols and PMIDs that embeddings blur. With diversify, more candidates
+    are fetched and near-duplicates (overlapping pages, repeated abstracts)
+    are dropped before maximal marginal relevance picks the final chunks,
+    so the prompt is not spent on the same passage twice.
 
     Args:
         namespace: str - The namespace to retrieve chunks from
         query: str - The query to retrieve chunks for 
         num_results: int - The number of results to retrieve
+        include_shared: bool - Also search SHARED_NAMESPACE
+        mode: str - "dense" or "hybrid"
+        diversify: bool - Apply near-duplicate removal and MMR
 
     Returns:
         list[str] - List of chunks
     """
     try:
-        response = index.query(
-            namespace=namespace,
-            vector=get_embeddings(query),
-            top_k=num_results,
-            include_metadata=True,
-            include_values=False
-        )
-        
-        if response['matches'] is None or response['matches'] == []:
+        vector_store = get_vector_store()
+        vector = get_embeddings(query)
+        namespaces = [namespace]
+        if include_shared and namespace != SHARED_NAMESPACE:
+            namespaces.append(SHARED_NAMESPACE)
+
+        hybrid = mode == "hybrid" and keyword_index is not None
+        depth = num_results * HYBRID_CANDIDATE_MULTIPLIER if hybrid else num_results
+        if diversify:
+            depth = max(depth, num_results * DIVERSIFY_FETCH_MULTIPLIER)
+
+        futures = {
+            name: _query_executor.submit(vector_store.query, name, vector, depth, True, diversify)
+            for name in namespaces
+        }
+        # Keyword searches run alongside the dense queries
+        keyword_futures = {
+            name: _query_executor.submit(_keyword_search, name, query, depth)
+            for name in namespaces
+        } if hybrid else {}
+        keyword_rankings = [
+            [
+                {'id': match['id'], 'score': match['score'], 'metadata': {'text': match['text']}, 'namespace': name}
+                for match in future.result()
+            ]
+            for name, future in keyword_futures.items()
+        ]
+        dense_matches = _dedupe_by_score([
+            dict(match, namespace=name) for name, future in futures.items() for match in future.result()
+        ])
+
+        if hybrid:
+            matches = reciprocal_rank_fusion([dense_matches, _merge_by_rank(keyword_rankings)])
+        else:
+            matches = dense_matches
+
+        if diversify:
+            candidates = matches[:depth]
+            _attach_values(vector_store, candidates)
+            candidates = [match for match in candidates if 'values' in match]
+            relevance = None
+            if hybrid:
+                # Fused scores are tiny rank sums; rescale them to [0, 1]
+                # so they weigh against cosine similarity in MMR
+                scores = [match['score'] for match in candidates]
+                low, high = min(scores, default=0.0), max(scores, default=0.0)
+                relevance = [(score - low) / (high - low) if high > low else 1.0 for score in scores]
+            matches = diversify_matches(vector, candidates, num_results, relevance=relevance)
+        else:
+            matches = matches[:num_results]
+
+        if not matches:
             return None
         
-        if len(response['matches']) > 0:
-            chunks = []
-            for match in response['matches']:
-                chunks.append(
-                    match['metadata']['text']
-                )
-            return chunks          
+        return [match['metadata']['text'] for match in matches]
     except Exception as e:
         logger.error(f"Error retrieving chunks: {traceback.format_exc()}")      
         raise e
@@ -48,7 +205,7 @@ def upsert_chunks(
     user_id: str
 ):
     """
-    Upsert chunks into Pinecone
+    Upsert chunks into the vector store
 
     Args:
         vectors: list[dict] - List of vectors to upsert
@@ -58,11 +215,9 @@ def upsert_chunks(
         bool - True if vectors were upserted successfully, False otherwise
     """
     try:
-        index.upsert(
-            vectors=vectors,
-            namespace=user_id,
-            batch_size=100
-        )
+        get_vector_store().upsert(user_id, vectors)
+        index_chunks(user_id, vectors)
+        namespace_changed(user_id)
         return True
     except Exception as e:
         logger.error(f"Error upserting chunks: {traceback.format_exc()}")
@@ -72,7 +227,9 @@ def transfer_vectors_from_default_namespace(
     user_id: str
 ):
     """
-    Transfer all vectors from the default namespace to a new namespace for a user
+    Transfer all vectors from the default namespace to a new namespace for a user.
+    The copy is streamed page by page and resumes where it stopped if a
+    previous attempt for this user was interrupted.
 
     Args:
         user_id: str - The user ID to transfer vectors to
@@ -81,33 +238,7 @@ def transfer_vectors_from_default_namespace(
         bool - True if vectors were transferred successfully, False otherwise
     """
     try:
-        vector_ids = list(index.list(namespace='chatbot'))
-
-        all_vectors = {}
-
-        for i in range(len(vector_ids)):
-            batch_ids = vector_ids[i]
-            response = index.fetch(batch_ids, namespace='chatbot')
-            all_vectors.update(response.vectors)
-
-        namespace = user_id
-
-        #all_vectors is a dictionary of vector ids and their corresponding vectors
-        #we need to convert it to a list of dictionaries
-        
-        vectors = []
-        for vector_id, vector in all_vectors.items():
-            vectors.append({
-                "id": vector_id,
-                "values": vector.values,
-                "metadata": vector.metadata
-            })
-
-        index.upsert(
-            vectors=vectors,
-            namespace=namespace,
-            batch_size=100
-        )
+        copy_namespace(SHARED_NAMESPACE, user_id)
         return True
     except Exception as e:
         logger.error(f"Error transferring vectors from default namespace: {traceback.format_exc()}")
@@ -0,0 +1,110 @@
+import os
+import asyncio
+import traceback
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from utils.logger import logger
+from utils.db_pool import run_db
+from utils.db_operations import connect_to_db, get_feed_user_ids, get_feed_seeds, save_feed_refresh
+from utils.helpers import find_related_publications
+
+load_dotenv()
+
+FEED_REFRESH_ENABLED = os.getenv("FEED_REFRESH_ENABLED", "true").lower() == "true"
+# Seconds between two refreshes of every user's feed
+FEED_REFRESH_INTERVAL = float(os.getenv("FEED_REFRESH_INTERVAL", str(6 * 60 * 60)))
+# Concurrent PubMed searches per user during a background refresh
+FEED_REFRESH_CONCURRENCY = int(os.getenv("FEED_REFRESH_CONCURRENCY", "3"))
+# PubMed entry dates are days, so each incremental search goes back a little
+# past the last one; anything already in the feed is skipped on insert
+FEED_REFRESH_OVERLAP = timedelta(days=1)
+# Arbitrary key for the Postgres advisory lock that makes only one worker
+# process run the refresher at a time
+FEED_REFRESH_LOCK_KEY = 7263001
+
+async def refresh_user_feed(
+    user_id: str,
+    concurrency: int = FEED_REFRESH_CONCURRENCY,
+    budget: Optional[float] = None
+) -> bool:
+    """
+    Search PubMed for publications related to the user's saved articles and
+    add the new ones to the stored feed. Each saved article is only searched
+    for PMIDs added since it was last searched.
+
+    Args:
+        user_id: str
+        concurrency: int - Maximum number of PubMed searches in flight
+        budget: Optional[float] - Seconds to wait before storing whatever has finished
+
+    Returns:
+        bool - False if some searches were cut off by the budget
+    """
+    try:
+        seeds = await run_db(get_feed_seeds, user_id)
+        mindates = {
+            article_id: (last_searched_at - FEED_REFRESH_OVERLAP).strftime("%Y/%m/%d")
+            for article_id, _, last_searched_at in seeds
+            if last_searched_at is not None
+        }
+
+        searched_at = datetime.now(timezone.utc)
+        completed_seeds = set()
+        publications, is_complete = await find_related_publications(
+            [(article_id, title) for article_id, title, _ in seeds],
+            concurrency=concurrency,
+            budget=budget,
+            mindates=mindates,
+            completed_seeds=completed_seeds
+        )
+        await run_db(save_feed_refresh, user_id, publications, list(completed_seeds), searched_at)
+
+        logger.info(f"Refreshed publication feed for {user_id}: {len(publications)} candidates from {len(completed_seeds)} of {len(seeds)} saved articles")
+        return is_complete
+    except Exception as e:
+        logger.error(f"Error refreshing publication feed for {user_id}: {traceback.format_exc()}")
+        raise e
+
+def _try_lock(conn) -> bool:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (FEED_REFRESH_LOCK_KEY,))
+        return cursor.fetchone()[0]
+
+async def refresh_all_feeds():
+    """
+    Refresh the feed of every user with saved articles, one user at a time
+    so the background job stays within the PubMed rate limit share it needs
+    """
+    user_ids = await run_db(get_feed_user_ids)
+    logger.info(f"Refreshing publication feeds for {len(user_ids)} users")
+    for user_id in user_ids:
+        try:
+            await refresh_user_feed(user_id)
+        except Exception:
+            # Already logged; move on to the next user
+            continue
+
+async def run_feed_refresher():
+    """
+    Background loop started with the application. Every worker process runs
+    it, but a Postgres advisory lock lets only one of them refresh per cycle.
+    """
+    while True:
+        conn = None
+        try:
+            conn = await asyncio.to_thread(connect_to_db)
+            conn.autocommit = True
+            if await asyncio.to_thread(_try_lock, conn):
+                await refresh_all_feeds()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.error(f"Error in publication feed refresher: {traceback.format_exc()}")
+        finally:
+            if conn is not None:
+                # Closing the session releases the advisory lock
+                conn.close()
+        await asyncio.sleep(FEED_REFRESH_INTERVAL)
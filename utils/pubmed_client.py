@@ -0,0 +1,254 @@
+import os
+import time
+import random
+import asyncio
+import xml.etree.ElementTree as ET
+from typing import AsyncIterator, Optional
+
+import httpx
+from lxml import etree
+from dotenv import load_dotenv
+
+from utils.logger import logger
+from utils.constants import articles_search_url, articles_fetch_url
+
+load_dotenv()
+
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")
+NCBI_TOOL = os.getenv("NCBI_TOOL", "chatbot_backend")
+NCBI_EMAIL = os.getenv("NCBI_EMAIL")
+# NCBI allows 3 requests/s per IP without an API key and 10 with one. The
+# limit is enforced per process, so lower it when running several workers.
+PUBMED_RATE_LIMIT = float(os.getenv("PUBMED_RATE_LIMIT", "10" if NCBI_API_KEY else "3"))
+PUBMED_TIMEOUT = float(os.getenv("PUBMED_TIMEOUT", "15"))
+PUBMED_MAX_RETRIES = int(os.getenv("PUBMED_MAX_RETRIES", "3"))
+PUBMED_MAX_CONNECTIONS = int(os.getenv("PUBMED_MAX_CONNECTIONS", "10"))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def _text(element) -> str:
+    return "".join(element.itertext()).strip() if element is not None else ""
+
+def parse_pubmed_article(article) -> dict:
+    """
+    Extract the fields we use from a PubmedArticle element
+
+    Args:
+        article: PubmedArticle element (ElementTree or lxml)
+
+    Returns:
+        dict - pmid, title, abstract, year, journal, authors, doi
+    """
+    pmid = _text(article.find("MedlineCitation/PMID")) or _text(article.find(".//ArticleId"))
+    year = _text(article.find(".//JournalIssue/PubDate/Year"))
+    if not year:
+        year = _text(article.find(".//JournalIssue/PubDate/MedlineDate"))[:4]
+    if not year:
+        year = _text(article.find(".//ArticleDate/Year"))
+
+    authors = []
+    for author in article.findall(".//AuthorList/Author"):
+        name = " ".join(part for part in (_text(author.find("ForeName")), _text(author.find("LastName"))) if part)
+        authors.append(name or _text(author.find("CollectiveName")))
+
+    doi = ""
+    for article_id in article.findall(".//ArticleIdList/ArticleId"):
+        if article_id.get("IdType") == "doi":
+            doi = _text(article_id)
+            break
+
+    return {
+        "pmid": pmid,
+        "title": _text(article.find(".//ArticleTitle")),
+        "abstract": " ".join(_text(text) for text in article.findall(".//AbstractText")),
+        "year": year,
+        "journal": _text(article.find(".//Journal/Title")),
+        "authors": [author for author in authors if author],
+        "doi": doi
+    }
+
+class TokenBucket:
+    """
+    Async token bucket: rate tokens per second, bursts of up to capacity
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Wait until a token is available and take it
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class PubMedClient:
+    """
+    Async client for the NCBI E-utilities esearch and efetch endpoints with
+    a shared keep-alive connection pool, client side rate limiting and
+    retries with exponential backoff on throttling and server errors
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = NCBI_API_KEY,
+        rate_limit: float = PUBMED_RATE_LIMIT,
+        timeout: float = PUBMED_TIMEOUT,
+        max_retries: int = PUBMED_MAX_RETRIES,
+        max_connections: int = PUBMED_MAX_CONNECTIONS
+    ):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_connections = max_connections
+        self._bucket = TokenBucket(rate_limit)
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    def _params(self, params: dict) -> dict:
+        params = dict(params, tool=NCBI_TOOL)
+        if NCBI_EMAIL:
+            params["email"] = NCBI_EMAIL
+        if self.api_key:
+            params["api_key"] = self.api_key
+        return params
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return float(response.headers["Retry-After"])
+        return min(2 ** attempt, 10) * 0.5 + random.uniform(0, 0.25)
+
+    async def send(self, url: str, params: dict, stream: bool = False) -> httpx.Response:
+        """
+        Rate limited GET with retries
+
+        Args:
+            url: str - E-utilities endpoint
+            params: dict - Query parameters
+            stream: bool - Return as soon as the headers arrive, leaving the
+                body to be read incrementally. The caller must aclose() it.
+
+        Returns:
+            httpx.Response - Successful response
+        """
+        params = self._params(params)
+        for attempt in range(self.max_retries + 1):
+            await self._bucket.acquire()
+            try:
+                request = self.client.build_request("GET", url, params=params)
+                response = await self.client.send(request, stream=stream)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if attempt == self.max_retries:
+                    raise e
+                delay = self._backoff(attempt)
+                logger.warning(f"PubMed request failed ({e!r}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                await response.aclose()
+                delay = self._backoff(attempt, response)
+                logger.warning(f"PubMed returned {response.status_code}, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.is_error:
+                await response.aclose()
+            response.raise_for_status()
+            return response
+
+    async def esearch(self, term: str, retmax: int = 10, mindate: Optional[str] = None) -> list[str]:
+        """
+        Search PubMed
+
+        Args:
+            term: str - Search term
+            retmax: int - Maximum number of PMIDs to return
+            mindate: Optional[str] - Only PMIDs added to PubMed on or after
+                this date (YYYY/MM/DD)
+
+        Returns:
+            list[str] - Matching PMIDs, most relevant first
+        """
+        params = {
+            "db": "pubmed",
+            "term": term,
+            "retmax": str(retmax),
+            "retmode": "xml"
+        }
+        if mindate is not None:
+            params.update({"datetype": "edat", "mindate": mindate, "maxdate": "3000"})
+        response = await self.send(articles_search_url, params)
+        root = ET.fromstring(response.content)
+        return [uid.text for uid in root.findall(".//Id")]
+
+    async def iter_articles(self, pmids: list[str]) -> AsyncIterator[dict]:
+        """
+        Fetch PubmedArticle records and yield each one, parsed, as soon as
+        its closing tag has been received. Parsed elements are discarded
+        straight away, so memory use does not grow with the response size.
+
+        Args:
+            pmids: list[str] - PMIDs to fetch
+
+        Yields:
+            dict - Parsed article, see parse_pubmed_article
+        """
+        if not pmids:
+            return
+        response = await self.send(articles_fetch_url, {
+            "db": "pubmed",
+            "id": ",".join(pmids),
+            "retmode": "xml"
+        }, stream=True)
+        parser = etree.XMLPullParser(events=("end",), tag="PubmedArticle", no_network=True, resolve_entities=False)
+        try:
+            async for chunk in response.aiter_bytes():
+                parser.feed(chunk)
+                for article in self._drain(parser):
+                    yield article
+            parser.close()
+            for article in self._drain(parser):
+                yield article
+        finally:
+            await response.aclose()
+
+    @staticmethod
+    def _drain(parser: etree.XMLPullParser):
+        for _, element in parser.read_events():
+            article = parse_pubmed_article(element)
+            # Free the subtree and any already processed siblings
+            element.clear(keep_tail=True)
+            parent = element.getparent()
+            while parent is not None and element.getprevious() is not None:
+                del parent[0]
+            yield article
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+pubmed_client = PubMedClient()
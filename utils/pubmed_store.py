@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import traceback
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from utils.logger import logger
+
+load_dotenv()
+
+PUBMED_STORE_ENABLED = os.getenv("PUBMED_STORE_ENABLED", "true").lower() == "true"
+PUBMED_STORE_PATH = os.getenv(
+    "PUBMED_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache", "pubmed.sqlite3")
+)
+# How long an esearch term -> PMID list stays valid (seconds)
+PUBMED_SEARCH_TTL = float(os.getenv("PUBMED_SEARCH_TTL", str(24 * 3600)))
+# Articles are re-fetched after this long to pick up corrections (seconds)
+PUBMED_ARTICLE_TTL = float(os.getenv("PUBMED_ARTICLE_TTL", str(30 * 24 * 3600)))
+
+class PubMedStore:
+    """
+    Local SQLite store of parsed PubMed articles keyed by PMID, plus a TTL
+    cache of esearch results keyed by (term, retmax)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        search_ttl: float,
+        article_ttl: float
+    ):
+        self.path = path
+        self.search_ttl = search_ttl
+        self.article_ttl = article_ttl
+        self._lock = threading.Lock()
+        self._counters = {
+            "search_hits": 0,
+            "search_misses": 0,
+            "article_hits": 0,
+            "article_misses": 0
+        }
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS articles (
+                pmid TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                abstract TEXT NOT NULL,
+                year TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS searches (
+                term TEXT NOT NULL,
+                retmax INTEGER NOT NULL,
+                pmids TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (term, retmax)
+            )
+        """)
+
+    def get_search(self, term: str, retmax: int) -> Optional[list[str]]:
+        """
+        Cached esearch result
+
+        Returns:
+            Optional[list[str]] - PMIDs, or None if absent or expired
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pmids FROM searches WHERE term = ? AND retmax = ? AND expires_at > ?",
+                (term, retmax, time.time())
+            ).fetchone()
+            self._counters["search_hits" if row else "search_misses"] += 1
+        return json.loads(row[0]) if row else None
+
+    def put_search(self, term: str, retmax: int, pmids: list[str]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches (term, retmax, pmids, expires_at) VALUES (?, ?, ?, ?)",
+                (term, retmax, json.dumps(pmids), time.time() + self.search_ttl)
+            )
+
+    def get_articles(self, pmids: list[str]) -> dict:
+        """
+        Stored articles that are still fresh
+
+        Args:
+            pmids: list[str] - PMIDs to look up
+
+        Returns:
+            dict - pmid -> article for the PMIDs that were found
+        """
+        if not pmids:
+            return {}
+        found = {}
+        with self._lock:
+            oldest = time.time() - self.article_ttl
+            for start in range(0, len(pmids), 500):
+                batch = pmids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for (fields,) in self._conn.execute(
+                    f"SELECT fields FROM articles WHERE pmid IN ({placeholders}) AND fetched_at > ?",
+                    batch + [oldest]
+                ):
+                    article = json.loads(fields)
+                    found[article["pmid"]] = article
+            self._counters["article_hits"] += len(found)
+            self._counters["article_misses"] += len(set(pmids)) - len(found)
+        return found
+
+    def put_articles(self, articles: list[dict]):
+        if not articles:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO articles (pmid, title, abstract, year, fields, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (article["pmid"], article["title"], article["abstract"], article["year"], json.dumps(article), now)
+                    for article in articles
+                ]
+            )
+            self._conn.execute("DELETE FROM searches WHERE expires_at <= ?", (now,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["articles"] = self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+            stats["searches"] = self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+        return stats
+
+pubmed_store = None
+if PUBMED_STORE_ENABLED:
+    try:
+        pubmed_store = PubMedStore(PUBMED_STORE_PATH, PUBMED_SEARCH_TTL, PUBMED_ARTICLE_TTL)
+    except Exception:
+        logger.error(f"PubMed store disabled, could not open {PUBMED_STORE_PATH}: {traceback.format_exc()}")
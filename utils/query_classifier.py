@@ -0,0 +1,249 @@
+import os
+import re
+import json
+import math
+import threading
+import traceback
+import unicodedata
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from utils.logger import logger
+
+load_dotenv()
+
+LABELS = ["actual", "cost_effective_analysis", "garbage", "greet"]
+
+QUERY_CLASSIFIER_ENABLED = os.getenv("QUERY_CLASSIFIER_ENABLED", "true").lower() == "true"
+QUERY_CLASSIFIER_PATH = os.getenv(
+    "QUERY_CLASSIFIER_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "artifacts", "query_classifier.json")
+)
+# Overrides the threshold chosen at training time when set
+QUERY_CLASSIFIER_THRESHOLD = os.getenv("QUERY_CLASSIFIER_THRESHOLD")
+
+_GREETING_PATTERN = re.compile(
+    r"^(hi+|hel+o+|hey+|hiya|howdy|yo|sup|greetings|hola|bonjour|namaste|namaskar|ciao|hallo|salut|"
+    r"good (morning|afternoon|evening|day)|morning|evening)"
+    r"( there| again| bot| chatbot| assistant| doc| doctor| friend| team| all| everyone)?"
+    r"[\s!.,:)(]*$"
+)
+_COST_PATTERN = re.compile(
+    r"\bcost[- ]?(effective(ness)?|benefit|utility|per qaly|analysis|comparison|savings?)\b|\bicer\b|"
+    r"\beconomic evaluation\b|\bbudget impact\b"
+)
+_KEYBOARD_ROWS = ("qwertyuiop", "asdfghjkl", "zxcvbnm")
+_VOWELS = set("aeiouy")
+
+_counters = {
+    "total": 0,
+    "rules": 0,
+    "model": 0,
+    "fallback": 0
+}
+_label_counts = {label: 0 for label in LABELS}
+_counters_lock = threading.Lock()
+
+def normalize_query(query: str) -> str:
+    """
+    Lower-case, strip accents and collapse whitespace
+
+    Args:
+        query: str - Raw user query
+
+    Returns:
+        str - Normalized query
+    """
+    text = unicodedata.normalize("NFKD", query)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+def _is_keyboard_mash(token: str) -> bool:
+    """
+    True when most of the token is made of runs of 4+ adjacent keys, so
+    "asdfasdf" counts but "property" (which contains "erty") does not
+    """
+    if len(token) < 4:
+        return False
+    covered = [False] * len(token)
+    for i in range(len(token) - 3):
+        if any(token[i:i + 4] in row for row in _KEYBOARD_ROWS):
+            for j in range(i, i + 4):
+                covered[j] = True
+    return sum(covered) / len(token) >= 0.75
+
+def extract_features(query: str) -> dict:
+    """
+    Turn a query into sparse term counts: words, word bigrams, character
+    trigrams and a few shape flags
+
+    Args:
+        query: str - Raw user query
+
+    Returns:
+        dict - feature -> count
+    """
+    text = normalize_query(query)
+    words = re.findall(r"\w+", text)
+    features = {}
+
+    def add(feature):
+        features[feature] = features.get(feature, 0) + 1
+
+    for word in words:
+        add("w:" + word)
+    for first, second in zip(words, words[1:]):
+        add("b:" + first + "_" + second)
+
+    padded = " " + text + " "
+    for i in range(len(padded) - 2):
+        add("c:" + padded[i:i + 3])
+
+    letters = [ch for ch in text if ch.isalpha()]
+    if not letters:
+        add("f:no_letters")
+    latin_words = [word for word in words if word.isascii() and word.isalpha()]
+    if latin_words and all(len(word) >= 5 and not (_VOWELS & set(word)) for word in latin_words):
+        add("f:no_vowels")
+    if any(_is_keyboard_mash(word) for word in words):
+        add("f:keyboard_mash")
+    if re.search(r"(.)\1{3,}", text):
+        add("f:repeated_char")
+    if "?" in text:
+        add("f:question_mark")
+    add(f"f:words_{min(len(words), 6)}")
+    return features
+
+def rule_classify(query: str) -> Optional[str]:
+    """
+    Classify the unambiguous cases with hand written rules
+
+    Args:
+        query: str - Raw user query
+
+    Returns:
+        Optional[str] - Label, or None if no rule applies
+    """
+    text = normalize_query(query)
+    if not any(ch.isalnum() for ch in text):
+        return "garbage"
+    if _GREETING_PATTERN.match(text):
+        return "greet"
+    if _COST_PATTERN.search(text):
+        return "cost_effective_analysis"
+
+    # Vowelless words are left to the model: they include biomedical
+    # acronyms such as NSCLC, which must not be rejected outright
+    words = re.findall(r"[a-z]+", text)
+    if words and not re.search(r"\d", text) and all(
+        _is_keyboard_mash(word) or re.search(r"(.)\1{3,}", word)
+        for word in words
+    ):
+        return "garbage"
+    return None
+
+class QueryClassifierModel:
+    """
+    TF-IDF features scored by a multinomial logistic regression, loaded from
+    the JSON artifact written by training/train_query_classifier.py
+    """
+
+    def __init__(self, artifact: dict):
+        self.labels = artifact["labels"]
+        self.vocabulary = artifact["vocabulary"]
+        self.idf = artifact["idf"]
+        self.weights = artifact["weights"]
+        self.bias = artifact["bias"]
+        self.threshold = artifact["threshold"]
+
+    @classmethod
+    def load(cls, path: str) -> "QueryClassifierModel":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def vectorize(self, query: str) -> dict:
+        """
+        Sparse, L2 normalized TF-IDF vector of the query
+
+        Returns:
+            dict - feature index -> weight
+        """
+        vector = {}
+        for feature, count in extract_features(query).items():
+            index = self.vocabulary.get(feature)
+            if index is not None:
+                vector[index] = (1 + math.log(count)) * self.idf[index]
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        if norm > 0:
+            vector = {index: value / norm for index, value in vector.items()}
+        return vector
+
+    def predict_proba(self, query: str) -> dict:
+        """
+        Returns:
+            dict - label -> probability
+        """
+        vector = self.vectorize(query)
+        scores = []
+        for label_weights, bias in zip(self.weights, self.bias):
+            scores.append(bias + sum(label_weights[index] * value for index, value in vector.items()))
+        top = max(scores)
+        exps = [math.exp(score - top) for score in scores]
+        total = sum(exps)
+        return {label: exp / total for label, exp in zip(self.labels, exps)}
+
+_model = None
+if QUERY_CLASSIFIER_ENABLED:
+    try:
+        _model = QueryClassifierModel.load(QUERY_CLASSIFIER_PATH)
+        if QUERY_CLASSIFIER_THRESHOLD is not None:
+            _model.threshold = float(QUERY_CLASSIFIER_THRESHOLD)
+    except Exception:
+        logger.error(f"Local query classifier model unavailable, using rules only: {traceback.format_exc()}")
+
+def classify_query_locally(query: str) -> tuple[Optional[str], float, str]:
+    """
+    Classify a query without calling the LLM when the local stage is
+    confident enough
+
+    Args:
+        query: str - Raw user query
+
+    Returns:
+        tuple - (label or None, confidence, source) where source is "rules",
+        "model" or "fallback". A None label means the caller should fall back
+        to the LLM classifier.
+    """
+    label, confidence, source = None, 0.0, "fallback"
+    if QUERY_CLASSIFIER_ENABLED:
+        label = rule_classify(query)
+        if label is not None:
+            confidence, source = 1.0, "rules"
+        elif _model is not None:
+            probabilities = _model.predict_proba(query)
+            best = max(probabilities, key=probabilities.get)
+            confidence = probabilities[best]
+            if confidence >= _model.threshold:
+                label, source = best, "model"
+
+    with _counters_lock:
+        _counters["total"] += 1
+        _counters[source] += 1
+        if label is not None:
+            _label_counts[label] += 1
+    return label, confidence, source
+
+def get_classifier_stats() -> dict:
+    """
+    Counters for the local classification stage
+
+    Returns:
+        dict - How often each stage decided, and the LLM fallback rate
+    """
+    with _counters_lock:
+        stats = dict(_counters)
+        stats["labels"] = dict(_label_counts)
+    stats["fallback_rate"] = stats["fallback"] / stats["total"] if stats["total"] else 0.0
+    stats["threshold"] = _model.threshold if _model is not None else None
+    return stats
@@ -0,0 +1,140 @@
+import os
+import time
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+from utils.logger import logger
+
+load_dotenv()
+
+SETTINGS_CACHE_ENABLED = os.getenv("SETTINGS_CACHE_ENABLED", "true").lower() == "true"
+# Seconds a cached entry is served before it is read again from Postgres.
+# This bounds how stale another worker's copy can get when no cross-worker
+# invalidation hook is installed.
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "60"))
+SETTINGS_CACHE_MAX_ITEMS = int(os.getenv("SETTINGS_CACHE_MAX_ITEMS", "10000"))
+
+class TTLCache:
+    """
+    Thread safe in-process cache whose entries expire after a fixed time,
+    evicting the least recently used entry when full. Every invalidation
+    bumps a generation counter: a reader that takes the generation before
+    loading a value and passes it to set cannot put back a value that was
+    invalidated while it was being loaded.
+    """
+
+    def __init__(self, ttl: float, max_items: int):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "invalidations": 0
+        }
+
+    def get(self, key):
+        """
+        Returns:
+            The cached value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._counters["misses"] += 1
+            return None
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, generation: Optional[int] = None):
+        """
+        Args:
+            generation: Optional[int] - From generation(), taken before value was
+                loaded; the value is dropped if anything was invalidated since
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(key, None) is not None:
+                self._counters["invalidations"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["items"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+settings_cache = TTLCache(SETTINGS_CACHE_TTL, SETTINGS_CACHE_MAX_ITEMS) if SETTINGS_CACHE_ENABLED else None
+
+_invalidation_hooks = []
+
+def register_invalidation_hook(hook: Callable[[str], None]):
+    """
+    Register a function called with the user_id whenever this worker changes
+    a user's settings, e.g. to publish the change to the other workers
+    (Redis pub/sub, Postgres NOTIFY, ...). The receiving side should call
+    invalidate_local_settings for each user_id it is told about.
+
+    Args:
+        hook: Callable[[str], None] - Called with the user_id after the write commits
+    """
+    _invalidation_hooks.append(hook)
+
+def invalidate_local_settings(user_id: str):
+    """
+    Drop this worker's cached settings for a user
+    """
+    if settings_cache is not None:
+        settings_cache.invalidate(user_id)
+
+def invalidate_settings(user_id: str):
+    """
+    Drop the cached settings for a user here and, through the registered
+    hooks, in the other workers. Hook failures are logged and ignored; the
+    TTL still bounds how long other workers can serve the old value.
+    """
+    invalidate_local_settings(user_id)
+    for hook in _invalidation_hooks:
+        try:
+            hook(user_id)
+        except Exception:
+            logger.error(f"Settings invalidation hook failed: {traceback.format_exc()}")
+
+def get_cached_settings(user_id: str) -> Optional[dict]:
+    if settings_cache is None:
+        return None
+    settings = settings_cache.get(user_id)
+    return dict(settings) if settings is not None else None
+
+def settings_generation() -> Optional[int]:
+    """
+    Take before reading settings from Postgres and pass to cache_settings
+    """
+    return settings_cache.generation() if settings_cache is not None else None
+
+def cache_settings(user_id: str, settings: dict, generation: Optional[int] = None):
+    if settings_cache is not None:
+        settings_cache.set(user_id, dict(settings), generation)
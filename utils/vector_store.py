@@ -0,0 +1,394 @@
+import os
+import json
+import threading
+import traceback
+from abc import ABC, abstractmethod
+from typing import Optional
+from urllib.parse import quote
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.logger import logger
+
+load_dotenv()
+
+# "pinecone" or "local"
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+VECTOR_STORE_PATH = os.getenv(
+    "VECTOR_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache", "vectors")
+)
+# float32, or float16 to halve disk at a small cost in precision; float16
+# namespaces are queried through a float32 copy held in memory
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32")
+# Log records after which a local namespace writes a fresh snapshot of its ids and metadata
+LOCAL_STORE_COMPACT_RECORDS = int(os.getenv("LOCAL_STORE_COMPACT_RECORDS", "1000"))
+# Rows widened to float32 at a time when building a float16 namespace's query copy
+LOCAL_STORE_WIDEN_BLOCK_ROWS = 4096
+
+class VectorStore(ABC):
+    """
+    Namespaced vector storage used by retrieval and ingestion. Vectors are
+    dicts of id, values and metadata; query scores are cosine similarities
+    (or whatever metric the Pinecone index was created with).
+    """
+
+    @abstractmethod
+    def query(self, namespace: str, vector: list, top_k: int, include_metadata: bool = True, include_values: bool = False) -> list[dict]:
+        """
+        Returns:
+            list[dict] - Matches with id, score and metadata, plus values when include_values is set, best first
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert(self, namespace: str, vectors: list[dict]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, namespace: str, ids: list[str]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_ids(self, namespace: str, limit: int = 100, pagination_token: Optional[str] = None) -> tuple[list[str], Optional[str]]:
+        """
+        One page of the ids in a namespace
+
+        Returns:
+            tuple - (ids, token for the next page or None on the last page)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def fetch(self, namespace: str, ids: list[str]) -> dict:
+        """
+        Returns:
+            dict - id -> vector dict, for the ids that exist
+        """
+        raise NotImplementedError
+
+class PineconeVectorStore(VectorStore):
+    """
+    VectorStore backed by a Pinecone index
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def query(self, namespace: str, vector: list, top_k: int, include_metadata: bool = True, include_values: bool = False) -> list[dict]:
+        response = self.index.query(
+            namespace=namespace,
+            vector=vector,
+            top_k=top_k,
+            include_metadata=include_metadata,
+            include_values=include_values
+        )
+        matches = []
+        for match in response["matches"] or []:
+            result = {"id": match["id"], "score": match["score"], "metadata": match.get("metadata") or {}}
+            if include_values:
+                result["values"] = match["values"]
+            matches.append(result)
+        return matches
+
+    def upsert(self, namespace: str, vectors: list[dict]):
+        self.index.upsert(vectors=vectors, namespace=namespace, batch_size=100)
+
+    def delete(self, namespace: str, ids: list[str]):
+        self.index.delete(ids=ids, namespace=namespace)
+
+    def list_ids(self, namespace: str, limit: int = 100, pagination_token: Optional[str] = None) -> tuple[list[str], Optional[str]]:
+        response = self.index.list_paginated(namespace=namespace, limit=limit, pagination_token=pagination_token)
+        next_token = response.pagination.next if response.pagination else None
+        return [vector.id for vector in response.vectors], next_token
+
+    def fetch(self, namespace: str, ids: list[str]) -> dict:
+        response = self.index.fetch(ids=ids, namespace=namespace)
+        return {
+            vector_id: {"id": vector_id, "values": vector.values, "metadata": vector.metadata}
+            for vector_id, vector in response.vectors.items()
+        }
+
+class _LocalNamespace:
+    """
+    One namespace of the local store: a memory-mapped matrix of unit length
+    rows plus the ids and metadata, kept as a JSON snapshot and an append
+    only log of the upserts and deletes since. Rows are kept contiguous;
+    deleting moves the last row into the gap.
+    """
+
+    def __init__(self, directory: str, dtype: np.dtype):
+        self.directory = directory
+        self.dtype = dtype
+        self.lock = threading.RLock()
+        self.ids = []
+        self.metadata = []
+        self.rows = {}
+        self.matrix = None
+        # float32 copy of a float16 matrix, built on the first query: numpy
+        # has no BLAS path for float16, which made queries ~10x slower
+        self.work = None
+        self.count = 0
+        # Each snapshot names the log generation written after it, so a
+        # crash while compacting never replays a log the snapshot includes
+        self.generation = 0
+        self.log_records = 0
+
+        state_path = os.path.join(directory, "state.json")
+        if os.path.exists(state_path):
+            with open(state_path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.ids = state["ids"]
+            self.metadata = state["metadata"]
+            self.generation = state.get("generation", 0)
+            self.count = len(self.ids)
+            self.rows = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self._replay_log()
+        if os.path.exists(os.path.join(directory, "vectors.npy")):
+            self.matrix = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r+")
+            # Keep the stored dtype; mixing files is not supported
+            self.dtype = self.matrix.dtype
+
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"log.{generation}.jsonl")
+
+    def _replay_log(self):
+        path = self._log_path(self.generation)
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A write torn by a crash; its vectors were never acknowledged
+                    break
+                if record["op"] == "upsert":
+                    self._apply_upsert(record["items"])
+                else:
+                    self._apply_delete(record["ids"])
+                self.log_records += 1
+
+    def _apply_upsert(self, items: list) -> list[int]:
+        rows = []
+        for vector_id, metadata in items:
+            row = self.rows.get(vector_id)
+            if row is None:
+                row = self.count
+                self.rows[vector_id] = row
+                self.ids.append(vector_id)
+                self.metadata.append(None)
+                self.count += 1
+            self.metadata[row] = metadata
+            rows.append(row)
+        return rows
+
+    def _apply_delete(self, ids: list[str]) -> list[tuple[int, int]]:
+        moves = []
+        for vector_id in ids:
+            row = self.rows.pop(vector_id, None)
+            if row is None:
+                continue
+            last = self.count - 1
+            if row != last:
+                moves.append((row, last))
+                self.ids[row] = self.ids[last]
+                self.metadata[row] = self.metadata[last]
+                self.rows[self.ids[row]] = row
+            self.ids.pop()
+            self.metadata.pop()
+            self.count -= 1
+        return moves
+
+    def _ensure_capacity(self, needed: int, dimension: int):
+        if self.matrix is not None and self.matrix.shape[1] != dimension:
+            raise ValueError(f"Vector dimension {dimension} does not match the namespace's {self.matrix.shape[1]}")
+        capacity = self.matrix.shape[0] if self.matrix is not None else 0
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, "vectors.npy")
+        tmp_path = path + ".tmp"
+        matrix = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self.dtype, shape=(new_capacity, dimension))
+        if self.matrix is not None:
+            matrix[:self.count] = self.matrix[:self.count]
+        matrix.flush()
+        del matrix
+        os.replace(tmp_path, path)
+        self.matrix = np.load(path, mmap_mode="r+")
+        self.work = None
+
+    def _append_log(self, record: dict):
+        # The rows are flushed first so a logged change never points at
+        # vectors that are not on disk
+        self.matrix.flush()
+        with open(self._log_path(self.generation), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        self.log_records += 1
+        if self.log_records >= LOCAL_STORE_COMPACT_RECORDS:
+            self._save_state()
+
+    def _save_state(self):
+        """
+        Write a snapshot of the ids and metadata and start a new log
+        """
+        old_log = self._log_path(self.generation)
+        self.generation += 1
+        path = os.path.join(self.directory, "state.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "metadata": self.metadata, "generation": self.generation}, f)
+        os.replace(path + ".tmp", path)
+        self.log_records = 0
+        if os.path.exists(old_log):
+            os.remove(old_log)
+
+    def upsert(self, vectors: list[dict]):
+        if not vectors:
+            return
+        values = np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        values /= np.where(norms == 0, 1, norms)
+        items = [[vector["id"], vector.get("metadata") or {}] for vector in vectors]
+        with self.lock:
+            new_ids = {vector["id"] for vector in vectors if vector["id"] not in self.rows}
+            self._ensure_capacity(self.count + len(new_ids), values.shape[1])
+            rows = self._apply_upsert(items)
+            for row, row_values in zip(rows, values):
+                self.matrix[row] = row_values
+            if self.work is not None:
+                self.work[rows] = self.matrix[rows].astype(np.float32)
+            self._append_log({"op": "upsert", "items": items})
+
+    def delete(self, ids: list[str]):
+        with self.lock:
+            moves = self._apply_delete(ids)
+            if self.matrix is None:
+                return
+            for row, last in moves:
+                self.matrix[row] = self.matrix[last]
+                if self.work is not None:
+                    self.work[row] = self.work[last]
+            self._append_log({"op": "delete", "ids": list(ids)})
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        if self.matrix.dtype == np.float32:
+            return self.matrix[:self.count] @ query
+        if self.work is None:
+            # Same capacity as the matrix so writes update it in place
+            self.work = np.empty(self.matrix.shape, dtype=np.float32)
+            for start in range(0, self.count, LOCAL_STORE_WIDEN_BLOCK_ROWS):
+                end = min(start + LOCAL_STORE_WIDEN_BLOCK_ROWS, self.count)
+                self.work[start:end] = self.matrix[start:end]
+        return self.work[:self.count] @ query
+
+    def query(self, vector: list, top_k: int, include_metadata: bool, include_values: bool) -> list[dict]:
+        with self.lock:
+            if self.count == 0:
+                return []
+            query = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            if norm > 0:
+                query /= norm
+            scores = self._scores(query)
+            top_k = min(top_k, self.count)
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            best = best[np.argsort(-scores[best])]
+            matches = []
+            for row in best:
+                match = {
+                    "id": self.ids[row],
+                    "score": float(scores[row]),
+                    "metadata": self.metadata[row] if include_metadata else {}
+                }
+                if include_values:
+                    match["values"] = self.matrix[row].astype(np.float32).tolist()
+                matches.append(match)
+            return matches
+
+    def list_ids(self, limit: int, pagination_token: Optional[str]) -> tuple[list[str], Optional[str]]:
+        with self.lock:
+            start = int(pagination_token) if pagination_token else 0
+            end = start + limit
+            return list(self.ids[start:end]), str(end) if end < self.count else None
+
+    def fetch(self, ids: list[str]) -> dict:
+        with self.lock:
+            found = {}
+            for vector_id in ids:
+                row = self.rows.get(vector_id)
+                if row is not None:
+                    found[vector_id] = {
+                        "id": vector_id,
+                        "values": self.matrix[row].astype(np.float32).tolist(),
+                        "metadata": self.metadata[row]
+                    }
+            return found
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process VectorStore keeping each namespace in a memory-mapped
+    float32 or float16 matrix under path, with exact cosine top-k computed
+    by one float32 matrix-vector product (float16 saves disk, not memory). Meant for small tenants, development,
+    tests and benchmarks; a namespace is only safe to write from one
+    process at a time. Values returned by fetch are the normalized vectors,
+    and list pagination tokens are offsets, so deleting while paging may
+    skip ids.
+    """
+
+    def __init__(self, path: str = VECTOR_STORE_PATH, dtype: str = VECTOR_STORE_DTYPE):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def _namespace(self, namespace: str) -> _LocalNamespace:
+        with self._lock:
+            if namespace not in self._namespaces:
+                directory = os.path.join(self.path, quote(namespace, safe=""))
+                self._namespaces[namespace] = _LocalNamespace(directory, self.dtype)
+            return self._namespaces[namespace]
+
+    def query(self, namespace: str, vector: list, top_k: int, include_metadata: bool = True, include_values: bool = False) -> list[dict]:
+        return self._namespace(namespace).query(vector, top_k, include_metadata, include_values)
+
+    def upsert(self, namespace: str, vectors: list[dict]):
+        self._namespace(namespace).upsert(vectors)
+
+    def delete(self, namespace: str, ids: list[str]):
+        self._namespace(namespace).delete(ids)
+
+    def list_ids(self, namespace: str, limit: int = 100, pagination_token: Optional[str] = None) -> tuple[list[str], Optional[str]]:
+        return self._namespace(namespace).list_ids(limit, pagination_token)
+
+    def fetch(self, namespace: str, ids: list[str]) -> dict:
+        return self._namespace(namespace).fetch(ids)
+
+_vector_store = None
+_vector_store_lock = threading.Lock()
+
+def get_vector_store() -> VectorStore:
+    """
+    The process wide vector store selected by VECTOR_STORE_BACKEND
+
+    Returns:
+        VectorStore
+    """
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                try:
+                    if VECTOR_STORE_BACKEND == "local":
+                        _vector_store = LocalVectorStore()
+                    elif VECTOR_STORE_BACKEND == "pinecone":
+                        from utils.initialize import index
+                        _vector_store = PineconeVectorStore(index)
+                    else:
+                        raise ValueError(f"Unknown VECTOR_STORE_BACKEND {VECTOR_STORE_BACKEND!r}")
+                    logger.info(f"Using the {VECTOR_STORE_BACKEND} vector store")
+                except Exception as e:
+                    logger.error(f"Error creating vector store: {traceback.format_exc()}")
+                    raise e
+    return _vector_store
@@ -13,9 +13,10 @@ from bs4 import BeautifulSoup
 
 from utils.logger import logger
 from utils.data_upload_utils import get_chunks
-from utils.openai_funcs import get_embeddings
+from utils.openai_funcs import get_embeddings_batch
 from utils.pinecone_funcs import upsert_chunks
 from utils.db_operations import update_web_crawl_urls, update_job_status
+from utils.db_pool import run_db
 
 def get_domain(url: str) -> str:
     """
@@ -105,9 +106,9 @@ async def process_and_upsert_content(content: str, user_id: str) -> bool:
         chunks = get_chunks(content)
         
         # Prepare vectors
+        embeddings = await asyncio.to_thread(get_embeddings_batch, chunks)
         vectors = []
-        for chunk in chunks:
-            vector = get_embeddings(chunk)
+        for chunk, vector in zip(chunks, embeddings):
             vectors.append({
                 "id": str(uuid.uuid4()),
                 "values": vector,
@@ -133,9 +134,9 @@ async def crawl_website(url: str, user_id: str, job_id: str, depth: int = 1):
         depth: int - Maximum number of pages to crawl (default: 1)
     """
     try:
-        update_job_status(job_id, "pending")
+        await run_db(update_job_status, job_id, "pending")
         # Add URL to web_crawl_urls array
-        update_web_crawl_urls(user_id, url)
+        await run_db(update_web_crawl_urls, user_id, url)
         
         domain = get_domain(url)
         driver = setup_selenium_driver()
@@ -166,11 +167,11 @@ async def crawl_website(url: str, user_id: str, job_id: str, depth: int = 1):
                 await asyncio.sleep(1)
                 
             # Update job status to succeeded
-            update_job_status(job_id, "succeeded")
+            await run_db(update_job_status, job_id, "succeeded")
                 
         except Exception as e:
             # Update job status to failed with error message
-            update_job_status(job_id, "failed", str(e))
+            await run_db(update_job_status, job_id, "failed", str(e))
             raise e
         finally:
             driver.quit()
@@ -178,5 +179,5 @@ async def crawl_website(url: str, user_id: str, job_id: str, depth: int = 1):
     except Exception as e:
         logger.error(f"Error in crawl_website: {traceback.format_exc()}")
         # Update job status to failed with error message
-        update_job_status(job_id, "failed", str(e))
+        await run_db(update_job_status, job_id, "failed", str(e))
         raise e 
\ No newline at end of file